@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import research, plan, chat, historical
+from app.routers import research, plan, chat, historical, metrics, companies
+from app.services.http_client import close_clients
+from app.services.news_store import start_news_poller, stop_news_poller
 
 app = FastAPI(title="Company Research Assistant")
 
@@ -22,3 +24,15 @@ app.include_router(research.router)
 app.include_router(plan.router)
 app.include_router(chat.router)
 app.include_router(historical.router)
+app.include_router(metrics.router)
+app.include_router(companies.router)
+
+
+@app.on_event("startup")
+async def startup():
+    start_news_poller()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_news_poller()
+    await close_clients()
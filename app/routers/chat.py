@@ -1,18 +1,50 @@
 from fastapi import APIRouter, Body
-from app.services.llm_generator import chat_with_research
+from fastapi.responses import StreamingResponse
+from app.services.llm_generator import chat_with_research, stream_chat_with_research
+from app.services.research_store import resolve_research
+from app.services.sse import sse_event, SSE_HEADERS
 
 router = APIRouter(prefix="/api", tags=["Chat"])
 
 @router.post("/chat")
 async def chat(payload: dict = Body(...)):
-    company = payload.get("company")
-    research = payload.get("research")
+    """Send `research_id` from /research/company, or the full `research` object"""
+    company, research, research_id, error = await resolve_research(payload)
     question = payload.get("question")
     
+    if error:
+        return {"error": error}
     if not company or not research or not question:
-        return {"error": "company, research, and question are required"}
+        return {"error": "company, research (or research_id), and question are required"}
     
-    response = await chat_with_research(company, research, question)
+    response = await chat_with_research(
+        company, research, question, bypass_cache=bool(payload.get("no_cache")), research_id=research_id
+    )
     return {"response": response}
 
+async def _chat_events(company: str, research: dict, question: str, no_cache: bool = False, research_id: str = None):
+    """SSE: `delta` chunks of the answer as they arrive, then `done` with the full response"""
+    chunks = []
+    try:
+        async for delta in stream_chat_with_research(company, research, question, bypass_cache=no_cache, research_id=research_id):
+            chunks.append(delta)
+            yield sse_event("delta", {"text": delta})
+    except Exception as e:
+        error_msg = f"I apologize, but I encountered an error: {str(e)}. Please try again."
+        print(error_msg)
+        yield sse_event("error", {"message": error_msg})
+    yield sse_event("done", {"response": "".join(chunks)})
 
+@router.post("/chat/stream")
+async def chat_stream(payload: dict = Body(...)):
+    """Same as /api/chat, streamed token by token as Server-Sent Events"""
+    company, research, research_id, error = await resolve_research(payload)
+    question = payload.get("question")
+
+    if error:
+        return {"error": error}
+    if not company or not research or not question:
+        return {"error": "company, research (or research_id), and question are required"}
+
+    events = _chat_events(company, research, question, bool(payload.get("no_cache")), research_id)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.services.symbol_directory import get_directory
+
+router = APIRouter(prefix="/companies", tags=["Companies"])
+
+@router.get("/suggest")
+async def suggest_companies(q: str, limit: int = 10):
+    """Autocomplete company names/tickers from the local symbol directory"""
+    limit = max(1, min(limit, 50))
+    return {"query": q, "suggestions": get_directory().suggest(q, limit)}
@@ -1,11 +1,43 @@
+import os
 from fastapi import APIRouter
-from app.services.historical_data import get_historical_financial_data, get_annual_financials
+from app.services.historical_data import (
+    PRICE_RESOLUTIONS,
+    get_historical_financial_data,
+    get_annual_financials,
+    compare_companies,
+    get_price_series,
+    downsample_series,
+)
+from app.services.fundamentals import get_derived_fundamentals
+from app.services.batch_jobs import normalize_companies
+from app.services.historical_pool import HistoricalPoolBusy, HistoricalTimeout, run_historical
+from app.services.singleflight import normalize_key
+from app.services.symbol_directory import normalize_name
 
 router = APIRouter(prefix="/historical", tags=["Historical"])
 
-@router.get("/financials")
-async def get_historical_financials(company: str, years: int = 10):
-    """Get historical financial data for a company"""
+HISTORICAL_COMPARE_MAX = int(os.getenv("HISTORICAL_COMPARE_MAX", "50"))
+COMPARE_METRICS = ("close", "marketCap")
+# Default / maximum points returned by /historical/prices after downsampling
+PRICE_POINTS_DEFAULT = int(os.getenv("PRICE_POINTS_DEFAULT", "300"))
+PRICE_POINTS_MAX = int(os.getenv("PRICE_POINTS_MAX", "5000"))
+
+def _company_key(kind: str, company: str, *options):
+    """
+    Dedupe key on the normalized name, so "Apple" and "apple inc" share one
+    call. Pure string work: the directory lookup happens on the pool.
+    """
+    return normalize_key(kind, normalize_name(company) or company, *options)
+
+async def _offload(key: str, fn, *args):
+    """Run on the historical worker pool; returns (result, error response)"""
+    try:
+        return await run_historical(key, fn, *args), None
+    except (HistoricalPoolBusy, HistoricalTimeout) as e:
+        print(f"✗ Historical call {key}: {e}")
+        return None, {"status": "error", "message": str(e)}
+
+def _load_financials(company: str, years: int):
     data = get_historical_financial_data(company, years)
     if data:
         return {"status": "success", "data": data}
@@ -16,4 +48,88 @@ async def get_historical_financials(company: str, years: int = 10):
             return {"status": "success", "data": annual_data}
         return {"status": "error", "message": "Could not fetch historical data"}
 
+@router.get("/financials")
+async def get_historical_financials(company: str, years: int = 10):
+    """Get historical financial data for a company"""
+    # Runs on the historical pool; concurrent requests for the same ticker share one fetch
+    result, error = await _offload(_company_key("financials", company, years), _load_financials, company, years)
+    return error or result
+
+@router.get("/prices")
+async def get_prices(
+    company: str,
+    years: int = 10,
+    resolution: str = "daily",
+    points: int = PRICE_POINTS_DEFAULT,
+    format: str = "columnar",
+):
+    """
+    Closing prices at daily/weekly/monthly resolution, reduced server-side to
+    at most `points` points with a shape-preserving (LTTB) downsampler.
+
+    format=columnar -> {"date": [...], "close": [...]}  (compact, default)
+    format=rows     -> [{"date": ..., "close": ...}, ...]
+    """
+    if resolution not in PRICE_RESOLUTIONS:
+        return {"status": "error", "message": f"resolution must be one of: {', '.join(PRICE_RESOLUTIONS)}"}
+    if format not in ("columnar", "rows"):
+        return {"status": "error", "message": "format must be columnar or rows"}
+    points = max(3, min(points, PRICE_POINTS_MAX))
+
+    series, error = await _offload(
+        _company_key("prices", company, years, resolution), get_price_series, company, years, resolution
+    )
+    if error:
+        return error
+    if not series:
+        return {"status": "error", "message": "Could not fetch price data"}
+
+    reduced = downsample_series(series, points)
+    data = {"date": reduced["date"], "close": reduced["close"]}
+    if format == "rows":
+        data = [{"date": date, "close": close} for date, close in zip(data["date"], data["close"])]
+    return {
+        "status": "success",
+        "ticker": series["ticker"],
+        "resolution": resolution,
+        "format": format,
+        "total_points": len(series["date"]),
+        "points": len(reduced["date"]),
+        "data": data,
+    }
+
+@router.get("/fundamentals")
+async def get_fundamentals(company: str):
+    """YoY growth, CAGR, operating/net margins, ROE and asset turnover from the annual statements"""
+    data, error = await _offload(_company_key("fundamentals", company), get_derived_fundamentals, company)
+    if error:
+        return error
+    if data:
+        return {"status": "success", "data": data}
+    return {"status": "error", "message": "Could not compute fundamentals"}
+
+@router.get("/compare")
+async def compare_historical(companies: str, years: int = 10, metric: str = "close"):
+    """
+    Side-by-side yearly series for several companies, e.g.
+    /historical/compare?companies=Apple,Microsoft,Alphabet
+
+    Returns one aligned matrix: `values[i][j]` is `metric` for `years[i]`
+    and `companies[j]` (null where a company has no data for that year).
+    """
+    names = normalize_companies(companies.split(","))
+    if not names:
+        return {"status": "error", "message": "companies is required"}
+    if len(names) > HISTORICAL_COMPARE_MAX:
+        return {"status": "error", "message": f"at most {HISTORICAL_COMPARE_MAX} companies per comparison"}
+    if metric not in COMPARE_METRICS:
+        return {"status": "error", "message": f"metric must be one of: {', '.join(COMPARE_METRICS)}"}
 
+    try:
+        result, error = await _offload(normalize_key("compare", *names, years, metric), compare_companies, names, years, metric)
+    except Exception as e:
+        print(f"✗ Historical comparison failed: {e}")
+        return {"status": "error", "message": "Could not fetch comparison data"}
+    if error:
+        return error
+    return {"status": "success", "metric": metric, **result}
@@ -0,0 +1,52 @@
+import asyncio
+from fastapi import APIRouter
+from app.services.source_cache import cache
+from app.services.singleflight import singleflight_stats
+from app.services.revalidation import revalidation_stats
+from app.services.news_store import news_store_stats
+from app.services.historical_pool import historical_pool_stats
+from app.services.llm_cache import llm_cache_stats
+from app.services.research_store import research_store_stats
+from app.services.llm_router import llm_router_stats
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+@router.get("/cache")
+async def cache_metrics():
+    """Hit/miss/eviction counters for the research and historical source cache"""
+    return cache.stats()
+
+@router.get("/singleflight")
+async def singleflight_metrics():
+    """Executions vs. coalesced (shared) callers per single-flight group"""
+    return singleflight_stats()
+
+@router.get("/revalidation")
+async def revalidation_metrics():
+    """Conditional GET outcomes (304 not modified vs. full refetch)"""
+    return revalidation_stats()
+
+@router.get("/news")
+async def news_metrics():
+    """Tracked companies, stored stories and collapsed near-duplicates"""
+    return await asyncio.to_thread(news_store_stats)
+
+@router.get("/historical")
+async def historical_metrics():
+    """Historical worker pool: queue depth, saturation, timeouts, rejections, deduplicated calls"""
+    return historical_pool_stats()
+
+@router.get("/llm_cache")
+async def llm_cache_metrics():
+    """LLM completion cache: hits, misses, bypasses, evictions and disk usage"""
+    return await asyncio.to_thread(llm_cache_stats)
+
+@router.get("/research_store")
+async def research_store_metrics():
+    """Stored research results referenced by research_id: entries, hits, expirations, evictions"""
+    return research_store_stats()
+
+@router.get("/llm_router")
+async def llm_router_metrics():
+    """Per-provider latency percentiles, error rate, circuit state, hedges and timeouts"""
+    return llm_router_stats()
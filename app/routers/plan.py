@@ -1,13 +1,116 @@
 from fastapi import APIRouter, Body
-from app.services.llm_generator import generate_account_plan
+from fastapi.responses import StreamingResponse
+from app.services.llm_generator import (
+    PLAN_PARALLEL,
+    PLAN_SECTIONS,
+    generate_account_plan,
+    generate_account_plan_parallel,
+    stream_account_plan,
+    iter_account_plan_sections,
+    find_plan_section,
+    regenerate_plan_section,
+)
+from app.services.research_store import resolve_research
+from app.services.sse import sse_event, SSE_HEADERS
 
 router = APIRouter(prefix="/plan", tags=["Plan"])
 
+def _parallel(payload: dict) -> bool:
+    return bool(payload.get("parallel", PLAN_PARALLEL))
+
 @router.post("/generate")
 async def gen_plan(payload: dict = Body(...)):
-    company = payload.get("company")
-    research = payload.get("research") 
+    """
+    Send `research_id` from /research/company, or the full `research` object.
+    `parallel: true` generates the sections as concurrent calls and assembles them in order.
+    """
+    company, research, _, error = await resolve_research(payload)
+    if error:
+        return {"error": error}
     if not company or not research:
-        return {"error": "company and research required"}
-    plan = await generate_account_plan(company, research)
+        return {"error": "company and research (or research_id) required"}
+    no_cache = bool(payload.get("no_cache"))
+    if _parallel(payload):
+        plan = await generate_account_plan_parallel(company, research, bypass_cache=no_cache)
+    else:
+        plan = await generate_account_plan(company, research, bypass_cache=no_cache)
     return {"company": company, "account_plan": plan}
+
+async def _plan_events(company: str, research, no_cache: bool = False):
+    """SSE: `delta` chunks of plan markdown as they arrive, then `done` with the full plan"""
+    chunks = []
+    try:
+        async for delta in stream_account_plan(company, research, bypass_cache=no_cache):
+            chunks.append(delta)
+            yield sse_event("delta", {"text": delta})
+    except Exception as e:
+        error_msg = f"Error generating account plan: {str(e)}"
+        print(error_msg)
+        yield sse_event("error", {"message": error_msg})
+    yield sse_event("done", {"company": company, "account_plan": "".join(chunks)})
+
+async def _plan_section_events(company: str, research, no_cache: bool = False):
+    """SSE: one `section` event per finished section (in completion order), then `done` with the assembled plan"""
+    sections = {}
+    try:
+        async for group in iter_account_plan_sections(company, research, bypass_cache=no_cache):
+            for number, markdown in sorted(group.items()):
+                sections[number] = markdown
+                yield sse_event("section", {"number": number, "title": PLAN_SECTIONS[number - 1][0], "markdown": markdown})
+    except Exception as e:
+        error_msg = f"Error generating account plan: {str(e)}"
+        print(error_msg)
+        yield sse_event("error", {"message": error_msg})
+    plan = "\n\n".join(sections[n] for n in sorted(sections))
+    yield sse_event("done", {"company": company, "account_plan": plan})
+
+@router.post("/generate/stream")
+async def gen_plan_stream(payload: dict = Body(...)):
+    """Same as /plan/generate, streamed as Server-Sent Events (token deltas, or whole sections when parallel)"""
+    company, research, _, error = await resolve_research(payload)
+    if error:
+        return {"error": error}
+    if not company or not research:
+        return {"error": "company and research (or research_id) required"}
+    no_cache = bool(payload.get("no_cache"))
+    if _parallel(payload):
+        events = _plan_section_events(company, research, no_cache)
+    else:
+        events = _plan_events(company, research, no_cache)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/section")
+async def regenerate_section(payload: dict = Body(...)):
+    """
+    Regenerate one plan section, named by number, title or slug (e.g. "6",
+    "whitespace-opportunities"). Pass the current `account_plan` to revise that
+    section in place and get the updated plan back, and optional `instructions`.
+    A fresh answer is generated unless `no_cache` is false.
+    """
+    company, research, _, error = await resolve_research(payload)
+    if error:
+        return {"error": error}
+    if not company or not research:
+        return {"error": "company and research (or research_id) required"}
+    number = find_plan_section(payload.get("section", ""))
+    if number is None:
+        titles = ", ".join(f"{n}. {title}" for n, (title, _) in enumerate(PLAN_SECTIONS, 1))
+        return {"error": f"Unknown section {payload.get('section')!r}; expected one of: {titles}"}
+
+    try:
+        content, plan = await regenerate_plan_section(
+            company,
+            research,
+            number,
+            account_plan=payload.get("account_plan"),
+            instructions=payload.get("instructions"),
+            bypass_cache=bool(payload.get("no_cache", True)),
+        )
+    except Exception as e:
+        return {"error": f"Error regenerating section: {str(e)}"}
+    return {
+        "company": company,
+        "section": {"number": number, "title": PLAN_SECTIONS[number - 1][0]},
+        "content": content,
+        "account_plan": plan,
+    }
@@ -1,45 +1,132 @@
-from fastapi import APIRouter
-from app.services.research_tools import (
-    fetch_wikipedia_detailed,
-    fetch_yahoo_finance_data,  # NEW: Reliable yfinance method
-    ddg_instant_answers,
-    scrape_company_website,
-    fetch_news_rss
-)
-from app.services.llm_generator import summarize_research_with_numbers
+from typing import Optional
+from fastapi import APIRouter, Body
+from fastapi.responses import StreamingResponse
+from app.services.research_pipeline import RESEARCH_SOURCES, gather_research, iter_research_sources, resolve_budget_ms
+from app.services.llm_generator import summarize_research_with_numbers, stream_llm_with_fallback, build_research_prompt, parse_analysis, analysis_parses
+from app.services.sse import sse_event, SSE_HEADERS
+from app.services.singleflight import SingleFlight, normalize_key
+from app.services.research_store import store_research
+from app.services.batch_jobs import BATCH_MAX_COMPANIES, normalize_companies, start_batch_job, get_batch_summary, get_batch_results, follow_batch_job
 
 router = APIRouter(prefix="/research", tags=["Research"])
 
-@router.get("/company")
-async def get_company_info(company: str):
-    # 1) Wikipedia
-    wiki = fetch_wikipedia_detailed(company)
+_research_flight = SingleFlight("research_company")
 
-    # 2) Yahoo Finance using yfinance library (RELIABLE)
-    yahoo_fin = fetch_yahoo_finance_data(company)
+async def _research_company(company: str, budget_ms: int, no_cache: bool = False):
+    # 1-5) Wikipedia, Yahoo Finance, DuckDuckGo, company website and news
+    # all run concurrently under one time budget
+    raw, timings = await gather_research(company, budget_ms)
+    timed_out = [name for name, value in raw.items() if isinstance(value, dict) and value.get("status") == "timeout"]
 
-    # 3) DuckDuckGo instant financial answers (short snippets)
-    ddg = ddg_instant_answers(company)
+    # 6) Summarize + numeric analysis with LLM
+    summary = await summarize_research_with_numbers(company, raw, bypass_cache=no_cache)
 
-    # 4) Company Website scraping
-    website = scrape_company_website(company)
+    result = {
+        "status": "success",
+        "partial": bool(timed_out),
+        "raw_data": raw,
+        "analysis": summary,
+        "budget_ms": budget_ms,
+        "timings_ms": timings,
+        "timed_out": timed_out
+    }
+    # Plan and chat can refer to this result by id instead of posting it back
+    return {**result, "research_id": await store_research(company, result)}
 
-    # 5) News RSS (Google News)
-    news = fetch_news_rss(company)
+@router.get("/company")
+async def get_company_info(company: str, budget_ms: Optional[int] = None, no_cache: bool = False):
+    """
+    `no_cache=true` regenerates the analysis instead of reusing a cached LLM completion.
+    The response's `research_id` can be sent to /plan and /api/chat in place of the research.
+    """
+    budget_ms = resolve_budget_ms(budget_ms)
+    # Identical concurrent requests share one pipeline run
+    return await _research_flight.do(
+        normalize_key(company, budget_ms, no_cache), _research_company, company, budget_ms, no_cache
+    )
 
-    raw = {
-        "wikipedia": wiki,
-        "yahoo_finance": yahoo_fin,
-        "ddg": ddg,
-        "website": website,
-        "news": news
-    }
+async def _research_events(company: str, budget_ms: int, no_cache: bool = False):
+    """SSE event stream: one `source` event per finished source, then `analysis_delta`
+    chunks while the LLM writes, then the parsed `analysis` and a final `done`."""
+    results = {}
+    timings = {}
+    timed_out = []
 
-    # 6) Summarize + numeric analysis with LLM
-    summary = await summarize_research_with_numbers(company, raw)
+    async for name, result, elapsed_ms in iter_research_sources(company, budget_ms):
+        results[name] = result
+        timings[name] = elapsed_ms
+        is_timeout = isinstance(result, dict) and result.get("status") == "timeout"
+        if is_timeout:
+            timed_out.append(name)
+        yield sse_event("source", {"source": name, "data": result, "elapsed_ms": elapsed_ms, "timed_out": is_timeout})
+
+    raw = {name: results.get(name) for name in RESEARCH_SOURCES}
 
-    return {
+    chunks = []
+    try:
+        async for delta in stream_llm_with_fallback(
+            build_research_prompt(company, raw), bypass_cache=no_cache, call_class="research", cacheable=analysis_parses
+        ):
+            chunks.append(delta)
+            yield sse_event("analysis_delta", {"text": delta})
+        analysis = parse_analysis("".join(chunks))
+    except Exception as e:
+        error_msg = f"Error calling LLM API: {str(e)}"
+        print(error_msg)
+        analysis = {"error": error_msg}
+        yield sse_event("error", {"message": error_msg})
+
+    yield sse_event("analysis", analysis)
+    summary = {
         "status": "success",
-        "raw_data": raw,
-        "analysis": summary
+        "partial": bool(timed_out),
+        "budget_ms": budget_ms,
+        "timings_ms": timings,
+        "timed_out": timed_out
     }
+    research_id = await store_research(company, {**summary, "raw_data": raw, "analysis": analysis})
+    yield sse_event("done", {**summary, "research_id": research_id})
+
+@router.get("/company/stream")
+async def stream_company_info(company: str, budget_ms: Optional[int] = None, no_cache: bool = False):
+    """Same pipeline as /research/company, streamed as Server-Sent Events"""
+    budget_ms = resolve_budget_ms(budget_ms)
+    return StreamingResponse(_research_events(company, budget_ms, no_cache), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/batch")
+async def create_batch(payload: dict = Body(...)):
+    """Research many companies in the background; poll or stream results by job id"""
+    companies = normalize_companies(payload.get("companies"))
+    if not companies:
+        return {"error": "companies (non-empty list of names) required"}
+    if len(companies) > BATCH_MAX_COMPANIES:
+        return {"error": f"at most {BATCH_MAX_COMPANIES} companies per batch"}
+
+    job = await start_batch_job(
+        companies,
+        budget_ms=payload.get("budget_ms"),
+        include_analysis=bool(payload.get("include_analysis", False))
+    )
+    return job.summary()
+
+@router.get("/batch/{job_id}")
+async def get_batch(job_id: str, offset: int = 0, limit: int = 100):
+    """Job progress plus results[offset:offset+limit] in completion order"""
+    summary = await get_batch_summary(job_id)
+    if not summary:
+        return {"status": "error", "message": f"Unknown batch job {job_id}"}
+    offset = max(offset, 0)
+    results = await get_batch_results(job_id, offset, max(limit, 0))
+    return {**summary, "offset": offset, "next_offset": offset + len(results), "results": results}
+
+async def _batch_events(job_id: str):
+    async for result in follow_batch_job(job_id):
+        yield sse_event("result", result)
+    yield sse_event("done", await get_batch_summary(job_id))
+
+@router.get("/batch/{job_id}/stream")
+async def stream_batch(job_id: str):
+    """Server-Sent Events: every finished company as a `result` event, then `done`"""
+    if not await get_batch_summary(job_id):
+        return {"status": "error", "message": f"Unknown batch job {job_id}"}
+    return StreamingResponse(_batch_events(job_id), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,348 @@
+"""
+Background batch research jobs.
+
+A job runs in the worker that accepted it, but its progress and results are
+written to the shared SQLite store as each company finishes, so any uvicorn
+worker can answer GET /research/batch/{id}. The owning worker streams new
+results straight from memory; other workers poll the store.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.services.research_pipeline import gather_research, resolve_budget_ms
+from app.services.llm_generator import summarize_research_with_numbers
+from app.services.source_cache import CACHE_DB_PATH, get_connection
+
+# Companies researched at once across all batch jobs (per-source limits live in research_pipeline)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+BATCH_MAX_COMPANIES = int(os.getenv("BATCH_MAX_COMPANIES", "1000"))
+# Finished jobs are forgotten after this many seconds
+BATCH_JOB_TTL = int(os.getenv("BATCH_JOB_TTL", "3600"))
+# Seconds between store reads when streaming a job owned by another worker
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "1"))
+# A running job with no progress for this long is treated as lost (its worker died)
+BATCH_STALL_TIMEOUT = 900
+
+_batch_limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+# Jobs running (or recently finished) in this worker
+_jobs = {}
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(CACHE_DB_PATH)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS batch_jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                budget_ms INTEGER NOT NULL,
+                include_analysis INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS batch_results (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )"""
+        )
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+class BatchJob:
+    """One batch research job; results are kept in completion order"""
+
+    def __init__(self, companies, budget_ms: int, include_analysis: bool):
+        self.job_id = uuid.uuid4().hex
+        self.companies = companies
+        self.budget_ms = budget_ms
+        self.include_analysis = include_analysis
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at = None
+        self.updated_at = self.created_at
+        self.results = []
+        self.failed = 0
+        self.task = None
+        self._subscribers = set()
+        # Results written to the shared store so far; writes go out in order under the lock
+        self.stored = 0
+        self._store_lock = asyncio.Lock()
+
+    def summary(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": len(self.companies),
+            "completed": len(self.results),
+            "failed": self.failed,
+            "budget_ms": self.budget_ms,
+            "include_analysis": self.include_analysis,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "updated_at": self.updated_at,
+        }
+
+    def publish(self, item):
+        for queue in self._subscribers:
+            queue.put_nowait(item)
+
+    def subscribe(self):
+        """Queue that receives every result after this call, then None when the job ends"""
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+
+# -------------------------
+# Shared store
+# -------------------------
+def _save_job(job: BatchJob):
+    conn = _db()
+    conn.execute(
+        """INSERT OR REPLACE INTO batch_jobs
+           (job_id, status, total, completed, failed, budget_ms, include_analysis, created_at, finished_at, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (job.job_id, job.status, len(job.companies), job.stored, _failed(job.results[:job.stored]), job.budget_ms,
+         int(job.include_analysis), job.created_at, job.finished_at, job.updated_at),
+    )
+    conn.commit()
+
+
+def _failed(results):
+    return sum(1 for result in results if result.get("status") == "error")
+
+
+def _save_results(job: BatchJob, start: int, results):
+    """Write results[start:] as seqs start.. and the new completed count, in one transaction"""
+    conn = _db()
+    conn.executemany(
+        "INSERT OR REPLACE INTO batch_results (job_id, seq, result) VALUES (?, ?, ?)",
+        [(job.job_id, start + i, json.dumps(result, default=str)) for i, result in enumerate(results)],
+    )
+    completed = start + len(results)
+    conn.execute(
+        "UPDATE batch_jobs SET status = ?, completed = ?, failed = ?, updated_at = ? WHERE job_id = ?",
+        (job.status, completed, _failed(job.results[:completed]), job.updated_at, job.job_id),
+    )
+    conn.commit()
+
+
+async def _flush_results(job: BatchJob):
+    """
+    Store every result not written yet. Writes are serialized per job, so
+    seqs always land in order and `completed` only grows; results that
+    finish while a write is running go out with the next one.
+    """
+    async with job._store_lock:
+        start = job.stored
+        pending = job.results[start:]
+        if not pending:
+            return
+        await asyncio.to_thread(_save_results, job, start, pending)
+        job.stored = start + len(pending)
+
+
+def _read_summary(job_id: str):
+    row = _db().execute(
+        """SELECT status, total, completed, failed, budget_ms, include_analysis, created_at, finished_at, updated_at
+           FROM batch_jobs WHERE job_id = ?""",
+        (job_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    status, total, completed, failed, budget_ms, include_analysis, created_at, finished_at, updated_at = row
+    if finished_at is None and time.time() - updated_at > BATCH_STALL_TIMEOUT:
+        status = "lost"
+    return {
+        "job_id": job_id,
+        "status": status,
+        "total": total,
+        "completed": completed,
+        "failed": failed,
+        "budget_ms": budget_ms,
+        "include_analysis": bool(include_analysis),
+        "created_at": created_at,
+        "finished_at": finished_at,
+        "updated_at": updated_at,
+    }
+
+
+def _read_results(job_id: str, offset: int, limit: int):
+    """Results from seq `offset` on, stopping at the first missing seq"""
+    rows = _db().execute(
+        "SELECT seq, result FROM batch_results WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+        (job_id, offset, limit),
+    ).fetchall()
+    results = []
+    for seq, result in rows:
+        if seq != offset + len(results):
+            break
+        results.append(json.loads(result))
+    return results
+
+
+def _prune_stored(now: float):
+    conn = _db()
+    expired = [job_id for (job_id,) in conn.execute(
+        "SELECT job_id FROM batch_jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (now - BATCH_JOB_TTL,)
+    )]
+    for job_id in expired:
+        conn.execute("DELETE FROM batch_results WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM batch_jobs WHERE job_id = ?", (job_id,))
+    conn.commit()
+
+
+async def _research_one(job: BatchJob, company: str):
+    async with _batch_limit:
+        started = time.perf_counter()
+        try:
+            raw, timings = await gather_research(company, job.budget_ms)
+            timed_out = [name for name, value in raw.items() if isinstance(value, dict) and value.get("status") == "timeout"]
+            result = {
+                "company": company,
+                "status": "success",
+                "partial": bool(timed_out),
+                "raw_data": raw,
+                "timings_ms": timings,
+                "timed_out": timed_out,
+            }
+            if job.include_analysis:
+                result["analysis"] = await summarize_research_with_numbers(company, raw)
+        except Exception as e:
+            print(f"✗ Batch research failed for {company}: {e}")
+            job.failed += 1
+            result = {"company": company, "status": "error", "message": str(e)}
+        result["elapsed_ms"] = int((time.perf_counter() - started) * 1000)
+
+    job.results.append(result)
+    job.updated_at = time.time()
+    job.publish(result)
+    try:
+        await _flush_results(job)
+    except Exception as e:
+        print(f"✗ Could not store batch result for {company}: {e}")
+
+
+async def _run_job(job: BatchJob):
+    job.status = "running"
+    try:
+        await asyncio.gather(*(_research_one(job, company) for company in job.companies))
+        job.status = "completed"
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        raise
+    finally:
+        job.finished_at = job.updated_at = time.time()
+        job.publish(None)
+        try:
+            await _flush_results(job)
+            async with job._store_lock:
+                await asyncio.to_thread(_save_job, job)
+        except Exception as e:
+            print(f"✗ Could not store batch job {job.job_id}: {e}")
+        print(f"✓ Batch job {job.job_id} finished: {len(job.results)}/{len(job.companies)} companies")
+
+
+def _prune_jobs(now: float):
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at and now - job.finished_at > BATCH_JOB_TTL:
+            del _jobs[job_id]
+
+
+def normalize_companies(companies):
+    """Strip blanks and drop duplicates (case-insensitive), keeping the first spelling"""
+    seen = set()
+    cleaned = []
+    for company in companies or []:
+        if not isinstance(company, str) or not company.strip():
+            continue
+        name = company.strip()
+        key = " ".join(name.lower().split())
+        if key not in seen:
+            seen.add(key)
+            cleaned.append(name)
+    return cleaned
+
+
+async def start_batch_job(companies, budget_ms=None, include_analysis: bool = False):
+    """Create a job, record it in the shared store and start researching in the background. Returns the BatchJob."""
+    now = time.time()
+    _prune_jobs(now)
+    job = BatchJob(companies, resolve_budget_ms(budget_ms), include_analysis)
+    await asyncio.to_thread(_prune_stored, now)
+    await asyncio.to_thread(_save_job, job)
+    _jobs[job.job_id] = job
+    job.task = asyncio.create_task(_run_job(job))
+    return job
+
+
+async def get_batch_summary(job_id: str):
+    """Progress of a job run by any worker, or None if unknown or expired"""
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.summary()
+    return await asyncio.to_thread(_read_summary, job_id)
+
+
+async def get_batch_results(job_id: str, offset: int, limit: int):
+    """results[offset:offset+limit] in completion order"""
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.results[offset:offset + limit]
+    return await asyncio.to_thread(_read_results, job_id, offset, limit)
+
+
+async def follow_batch_job(job_id: str):
+    """
+    Every result so far, then each new one as it finishes, until the job
+    ends. Jobs owned by this worker are followed in memory, others by
+    polling the shared store every BATCH_POLL_INTERVAL seconds.
+    """
+    job = _jobs.get(job_id)
+    if job is not None:
+        queue = job.subscribe()
+        try:
+            for result in list(job.results):
+                yield result
+            if job.finished_at is None:
+                while True:
+                    result = await queue.get()
+                    if result is None:
+                        break
+                    yield result
+        finally:
+            job.unsubscribe(queue)
+        return
+
+    offset = 0
+    while True:
+        summary = await asyncio.to_thread(_read_summary, job_id)
+        if summary is None:
+            return
+        results = await asyncio.to_thread(_read_results, job_id, offset, -1)
+        for result in results:
+            yield result
+        offset += len(results)
+        if summary["finished_at"] is not None or summary["status"] == "lost":
+            return
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
@@ -0,0 +1,183 @@
+"""
+Token-budgeted prompt context.
+
+Instead of dumping research data as indented JSON and cutting it at a
+character count, the payload is split into fields, each field gets a
+priority, and fields are packed most-important-first into a token budget.
+A field that doesn't fit whole is shortened (strings truncated, lists and
+objects trimmed to their leading items). The result is compact JSON with
+the original nesting.
+
+Tokens are counted locally with tiktoken when it's installed, otherwise
+estimated at ~4 characters per token.
+"""
+import json
+import math
+import os
+
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "o200k_base")
+CONTEXT_TOKENS_RESEARCH = int(os.getenv("CONTEXT_TOKENS_RESEARCH", "5000"))
+CONTEXT_TOKENS_PLAN = int(os.getenv("CONTEXT_TOKENS_PLAN", "4000"))
+CONTEXT_TOKENS_CHAT = int(os.getenv("CONTEXT_TOKENS_CHAT", "2500"))
+
+CHARS_PER_TOKEN = 4
+# Don't bother shortening a field into less room than this
+MIN_PARTIAL_TOKENS = 40
+# Leaves are fields at most this deep; deeper structures are packed as one value
+MAX_DEPTH = 3
+DEFAULT_PRIORITY = 5
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER)
+except Exception:
+    # Not installed, or the encoding couldn't be loaded (e.g. offline)
+    _encoding = None
+
+# Path prefix -> priority (lower is packed first); None drops the field.
+# The longest matching prefix wins.
+RESEARCH_PRIORITIES = {
+    ("fundamentals",): 0,
+    ("yahoo_finance",): 1,
+    ("yahoo_finance", "Business Summary"): 3,
+    ("yahoo_finance", "Website"): 4,
+    ("wikipedia",): 2,
+    ("wikipedia", "infobox"): 1,
+    ("wikipedia", "content_snippet"): 7,
+    ("wikipedia", "url"): 6,
+    ("wikipedia", "logo_url"): None,
+    ("news",): 2,
+    ("website",): 3,
+    ("website", "pages"): 6,
+    ("ddg",): 4,
+    ("ddg", "RelatedTopics"): 6,
+}
+
+# Plan/chat receive the /research/company response: analysis first, then raw data
+_RESPONSE_PRIORITIES = {
+    ("analysis",): 1,
+    ("analysis", "executive_summary"): 0,
+    ("analysis", "numeric_table"): 0,
+    ("analysis", "raw_data"): None,
+    ("status",): None,
+    ("partial",): None,
+    ("budget_ms",): None,
+    ("timings_ms",): None,
+    ("timed_out",): None,
+    ("research_id",): None,
+}
+PLAN_PRIORITIES = {
+    **RESEARCH_PRIORITIES,
+    **{("raw_data", *path): None if p is None else p + 1 for path, p in RESEARCH_PRIORITIES.items()},
+    **_RESPONSE_PRIORITIES,
+}
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else _encoding.decode(tokens[:max_tokens]) + "…"
+    limit = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _priority(path, priorities):
+    for end in range(len(path), 0, -1):
+        if path[:end] in priorities:
+            return priorities[path[:end]]
+    return DEFAULT_PRIORITY
+
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _leaves(value, path=()):
+    """(path, value) for every field, descending into objects up to MAX_DEPTH"""
+    if isinstance(value, dict) and len(path) < MAX_DEPTH:
+        for key, child in value.items():
+            yield from _leaves(child, (*path, str(key)))
+    elif not _is_empty(value):
+        yield path, value
+
+
+def _cost(key, value) -> int:
+    return count_tokens(compact_json({key: value}))
+
+
+def _fit(key, value, budget: int):
+    """`value`, or a shortened version, costing at most `budget` tokens (None if nothing useful fits)"""
+    cost = _cost(key, value)
+    if cost <= budget:
+        return value, cost
+    if budget < MIN_PARTIAL_TOKENS:
+        return None, 0
+    if isinstance(value, str):
+        overhead = _cost(key, "")
+        text = truncate_to_tokens(value, budget - overhead - 1)
+        return (text, _cost(key, text)) if text else (None, 0)
+    if isinstance(value, (list, dict)):
+        items = list(value.items()) if isinstance(value, dict) else list(value)
+        kept = []
+        for item in items:
+            candidate = kept + [item]
+            shaped = dict(candidate) if isinstance(value, dict) else candidate
+            if _cost(key, shaped) > budget:
+                break
+            kept = candidate
+        if kept:
+            shaped = dict(kept) if isinstance(value, dict) else kept
+            return shaped, _cost(key, shaped)
+    return None, 0
+
+
+def _place(tree: dict, path, value):
+    node = tree
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+
+
+def build_context(data, max_tokens: int, priorities: dict = None) -> str:
+    """
+    Compact JSON of `data` packed into `max_tokens`, highest-priority fields
+    first. Fields keep their original nesting and relative order.
+    """
+    if not isinstance(data, dict):
+        return truncate_to_tokens(data if isinstance(data, str) else compact_json(data), max_tokens)
+
+    priorities = priorities or {}
+    fields = []
+    for order, (path, value) in enumerate(_leaves(data)):
+        priority = _priority(path, priorities)
+        if priority is not None:
+            fields.append((priority, order, path, value))
+    fields.sort(key=lambda field: field[:2])
+
+    # Braces/commas/parent keys aren't in the per-field costs; keep some slack
+    remaining = int(max_tokens * 0.95) - 2
+    packed = []
+    for _, order, path, value in fields:
+        if remaining < 1:
+            break
+        fitted, cost = _fit(path[-1], value, remaining)
+        if fitted is not None:
+            packed.append((order, path, fitted))
+            remaining -= cost + 1
+
+    tree = {}
+    for _, path, value in sorted(packed, key=lambda field: field[0]):
+        _place(tree, path, value)
+    return compact_json(tree)
@@ -0,0 +1,36 @@
+"""
+Shape-preserving point reduction for chart series.
+
+Largest-Triangle-Three-Buckets (LTTB): keeps the first and last points and,
+from each bucket in between, the point forming the largest triangle with the
+previously kept point and the average of the next bucket. Peaks, troughs
+and trend changes survive; flat stretches collapse.
+"""
+import numpy as np
+
+
+def lttb_indices(x, y, threshold: int):
+    """Indices of the points LTTB keeps when reducing (x, y) to `threshold` points"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket i spans edges[i]:edges[i + 1]; the first and last points are kept as-is
+    every = (n - 2) / (threshold - 2)
+    edges = np.minimum(np.floor(np.arange(threshold) * every).astype(int) + 1, n)
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], max(edges[i + 2] if i + 2 < threshold else n, edges[i + 1] + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        kept[i + 1] = a
+    return kept
@@ -0,0 +1,271 @@
+"""
+Local store for historical financials, written through by historical_data.
+
+Two column-per-field SQLite tables keyed by ticker and period:
+  financial_prices      one row per (ticker, calendar year): last close of the year
+  financial_statements  one row per (ticker, fiscal period end): income/balance items
+
+Closed periods are immutable: a past year's close is never refetched and a
+stored statement value is never overwritten (later downloads only fill gaps).
+Closes are split-adjusted (not dividend-adjusted) as Yahoo reports them, so
+a new stock split invalidates the ticker's stored closes and share count.
+Only the open period -- the current year's close and shares outstanding --
+is refreshed, incrementally, once it is older than FINANCIALS_OPEN_TTL.
+A multi-year range is then one indexed scan instead of several yfinance calls.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from app.services.source_cache import CACHE_DB_PATH, get_connection
+
+# Refresh the open period (current year's close, shares outstanding) after this many seconds
+FINANCIALS_OPEN_TTL = int(os.getenv("FINANCIALS_OPEN_TTL", "86400"))
+# Re-check for a newly published fiscal year at most this often, and only once
+# the latest stored period is a year old
+FINANCIALS_STATEMENTS_TTL = int(os.getenv("FINANCIALS_STATEMENTS_TTL", str(7 * 86400)))
+
+STATEMENT_FIELDS = ["revenue", "netIncome", "operatingIncome", "totalAssets", "totalEquity"]
+
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(CACHE_DB_PATH)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS financial_prices (
+                ticker TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                close_date TEXT NOT NULL,
+                close REAL,
+                closed INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (ticker, year)
+            )"""
+        )
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS financial_statements (
+                ticker TEXT NOT NULL,
+                period_end TEXT NOT NULL,
+                {", ".join(f'"{field}" REAL' for field in STATEMENT_FIELDS)},
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (ticker, period_end)
+            )"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS financial_meta (
+                ticker TEXT PRIMARY KEY,
+                prices_from_year INTEGER,
+                prices_checked_at REAL NOT NULL DEFAULT 0,
+                shares_outstanding REAL,
+                shares_checked_at REAL NOT NULL DEFAULT 0,
+                statements_checked_at REAL NOT NULL DEFAULT 0,
+                last_split TEXT
+            )"""
+        )
+        try:
+            # Stores created before split tracking
+            conn.execute("ALTER TABLE financial_meta ADD COLUMN last_split TEXT")
+        except sqlite3.OperationalError:
+            pass
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _meta(ticker: str):
+    row = _db().execute(
+        "SELECT prices_from_year, prices_checked_at, shares_outstanding, shares_checked_at, statements_checked_at FROM financial_meta WHERE ticker = ?",
+        (ticker,),
+    ).fetchone()
+    return row or (None, 0, None, 0, 0)
+
+
+def _update_meta(conn, ticker: str, **fields):
+    conn.execute("INSERT OR IGNORE INTO financial_meta (ticker) VALUES (?)", (ticker,))
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn.execute(f"UPDATE financial_meta SET {assignments} WHERE ticker = ?", (*fields.values(), ticker))
+
+
+# -------------------------
+# Prices (one close per calendar year)
+# -------------------------
+def prices_refresh_from(ticker: str, start_year: int):
+    """
+    First year whose prices must be downloaded to serve `start_year`..now,
+    or None when the store already covers it. Closed years are never
+    refetched; an open year is refetched once FINANCIALS_OPEN_TTL has passed.
+    """
+    covered_from, checked_at = _meta(ticker)[:2]
+    if covered_from is None or start_year < covered_from:
+        # Not covered yet: one download spans the gap and the open year
+        return start_year
+    if time.time() - checked_at <= FINANCIALS_OPEN_TTL:
+        return None
+    # Refetch from the oldest year still open when it was stored (normally
+    # the current one, or last year right after the turn of the year)
+    open_year = _db().execute(
+        "SELECT MIN(year) FROM financial_prices WHERE ticker = ? AND closed = 0", (ticker,)
+    ).fetchone()[0]
+    return open_year if open_year is not None else datetime.now().year
+
+
+def split_invalidates(ticker: str, last_split) -> bool:
+    """
+    Whether a split dated `last_split` (latest split in a refresh download) is
+    newer than the store knows of, so the stored closes are on a pre-split basis.
+    """
+    if last_split is None:
+        return False
+    covered_from = _meta(ticker)[0]
+    known = _db().execute("SELECT last_split FROM financial_meta WHERE ticker = ?", (ticker,)).fetchone()
+    known = known[0] if known else None
+    return covered_from is not None and (known is None or last_split.strftime("%Y-%m-%d") > known)
+
+
+def invalidate_prices(ticker: str):
+    """Drop a ticker's closes and share count after a split; the next read refetches them"""
+    conn = _db()
+    conn.execute("DELETE FROM financial_prices WHERE ticker = ?", (ticker,))
+    _update_meta(
+        conn, ticker,
+        prices_from_year=None, prices_checked_at=0, shares_outstanding=None, shares_checked_at=0,
+    )
+    conn.commit()
+    print(f"✓ Stock split for {ticker}: stored closes invalidated")
+
+
+def write_prices(ticker: str, closes: pd.DataFrame, covered_from: int, last_split=None):
+    """
+    Store yearly closes (columns `date`, `close`). Years before the current
+    one are written as closed and only replaced after a split (see
+    split_invalidates). `last_split` is the latest split in the download.
+    """
+    now = time.time()
+    current_year = datetime.now().year
+    conn = _db()
+    conn.executemany(
+        """INSERT INTO financial_prices (ticker, year, close_date, close, closed, fetched_at) VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT(ticker, year) DO UPDATE SET
+               close_date = excluded.close_date, close = excluded.close,
+               closed = excluded.closed, fetched_at = excluded.fetched_at
+           WHERE financial_prices.closed = 0""",
+        [
+            (ticker, date.year, date.strftime("%Y-%m-%d"), float(close), int(date.year < current_year), now)
+            for date, close in zip(closes["date"], closes["close"])
+        ],
+    )
+    previous = _meta(ticker)[0]
+    fields = {
+        "prices_from_year": min(covered_from, previous) if previous is not None else covered_from,
+        "prices_checked_at": now,
+    }
+    if last_split is not None:
+        known = conn.execute("SELECT last_split FROM financial_meta WHERE ticker = ?", (ticker,)).fetchone()
+        fields["last_split"] = max(filter(None, [known[0] if known else None, last_split.strftime("%Y-%m-%d")]))
+    _update_meta(conn, ticker, **fields)
+    conn.commit()
+
+
+def read_prices(ticker: str, start_year: int) -> pd.DataFrame:
+    """Yearly closes from `start_year` on: columns `date`, `close`, oldest first"""
+    frame = pd.read_sql_query(
+        "SELECT close_date AS date, close FROM financial_prices WHERE ticker = ? AND year >= ? ORDER BY year",
+        _db(),
+        params=(ticker, start_year),
+    )
+    frame["date"] = pd.to_datetime(frame["date"])
+    return frame
+
+
+def read_prices_many(tickers, start_year: int) -> pd.DataFrame:
+    """Yearly closes for several tickers in one scan: index = year, one column per ticker"""
+    placeholders = ", ".join("?" for _ in tickers)
+    frame = pd.read_sql_query(
+        f"SELECT ticker, year, close FROM financial_prices WHERE ticker IN ({placeholders}) AND year >= ?",
+        _db(),
+        params=(*tickers, start_year),
+    )
+    return frame.pivot(index="year", columns="ticker", values="close").reindex(columns=list(tickers)).sort_index()
+
+
+def stored_shares_outstanding(tickers) -> dict:
+    """Shares outstanding already in the store (no freshness check)"""
+    placeholders = ", ".join("?" for _ in tickers)
+    rows = _db().execute(
+        f"SELECT ticker, shares_outstanding FROM financial_meta WHERE ticker IN ({placeholders}) AND shares_outstanding IS NOT NULL",
+        tuple(tickers),
+    ).fetchall()
+    return dict(rows)
+
+
+# -------------------------
+# Shares outstanding (open period only)
+# -------------------------
+def shares_outstanding(ticker: str):
+    """(stored value, True if it needs refreshing)"""
+    shares, checked_at = _meta(ticker)[2:4]
+    return shares, time.time() - checked_at > FINANCIALS_OPEN_TTL
+
+
+def write_shares_outstanding(ticker: str, shares):
+    conn = _db()
+    _update_meta(conn, ticker, shares_outstanding=shares, shares_checked_at=time.time())
+    conn.commit()
+
+
+# -------------------------
+# Fiscal-year statements
+# -------------------------
+def statements_due(ticker: str) -> bool:
+    """Whether a statements download could add anything the store lacks"""
+    checked_at = _meta(ticker)[4]
+    if not checked_at:
+        return True
+    if time.time() - checked_at < FINANCIALS_STATEMENTS_TTL:
+        return False
+    latest = _db().execute(
+        "SELECT MAX(period_end) FROM financial_statements WHERE ticker = ?", (ticker,)
+    ).fetchone()[0]
+    return latest is None or (datetime.now() - datetime.fromisoformat(latest)).days >= 365
+
+
+def write_statements(ticker: str, statements: pd.DataFrame):
+    """
+    Store fiscal periods (index = period end, columns from STATEMENT_FIELDS).
+    Values already stored are kept; a download only fills missing ones.
+    """
+    now = time.time()
+    columns = ", ".join(f'"{field}"' for field in STATEMENT_FIELDS)
+    fill = ", ".join(f'"{field}" = COALESCE(financial_statements."{field}", excluded."{field}")' for field in STATEMENT_FIELDS)
+    rows = [
+        (ticker, period_end.strftime("%Y-%m-%d"), *[None if pd.isna(v) else float(v) for v in values], now)
+        for period_end, *values in statements.reindex(columns=STATEMENT_FIELDS).itertuples()
+    ]
+    conn = _db()
+    conn.executemany(
+        f"""INSERT INTO financial_statements (ticker, period_end, {columns}, fetched_at)
+            VALUES (?, ?, {", ".join("?" for _ in STATEMENT_FIELDS)}, ?)
+            ON CONFLICT(ticker, period_end) DO UPDATE SET {fill}""",
+        rows,
+    )
+    _update_meta(conn, ticker, statements_checked_at=now)
+    conn.commit()
+
+
+def read_statements(ticker: str) -> pd.DataFrame:
+    """All stored fiscal periods, indexed by period end (oldest first)"""
+    columns = ", ".join(f'"{field}"' for field in STATEMENT_FIELDS)
+    frame = pd.read_sql_query(
+        f"SELECT period_end, {columns} FROM financial_statements WHERE ticker = ? ORDER BY period_end",
+        _db(),
+        params=(ticker,),
+    )
+    frame["period_end"] = pd.to_datetime(frame["period_end"])
+    return frame.set_index("period_end").astype(float)
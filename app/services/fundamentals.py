@@ -0,0 +1,102 @@
+"""
+Derived fundamentals computed from the stored annual statements.
+
+Growth, CAGR, margins, ROE and asset turnover are plain array operations
+over the fiscal-year series, so the research prompt gets exact figures
+instead of asking the LLM to work them out.
+"""
+import numpy as np
+import pandas as pd
+
+from app.services.historical_data import get_company_ticker, load_statements
+
+
+def _ratio(numerator, denominator):
+    """Elementwise numerator / denominator, NaN where either is missing or the denominator isn't positive"""
+    valid = np.isfinite(numerator) & np.isfinite(denominator) & (denominator > 0)
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=valid)
+
+
+def _yoy_growth(values):
+    """Year-over-year growth in %, NaN for the first year and non-positive bases"""
+    growth = np.full(values.shape, np.nan)
+    if len(values) > 1:
+        growth[1:] = (_ratio(values[1:], values[:-1]) - 1) * 100
+    return growth
+
+
+def _average_with_prior(values):
+    """Mean of each period and the one before; the period value itself when there is no prior"""
+    prior = np.concatenate(([np.nan], values[:-1]))
+    return np.where(np.isfinite(prior), (values + prior) / 2, values)
+
+
+def _cagr(years, values):
+    """Compound annual growth between the first and last positive values, in %"""
+    mask = np.isfinite(values) & (values > 0)
+    if mask.sum() < 2:
+        return None
+    years, values = years[mask], values[mask]
+    span = years[-1] - years[0]
+    if span <= 0:
+        return None
+    return {
+        "from": str(years[0]),
+        "to": str(years[-1]),
+        "years": int(span),
+        "pct": round(float(((values[-1] / values[0]) ** (1 / span) - 1) * 100), 2),
+    }
+
+
+def _clean(values, digits):
+    return [None if not np.isfinite(v) else round(float(v), digits) for v in values]
+
+
+def compute_fundamentals(statements: pd.DataFrame):
+    """
+    Derived metrics from annual statements indexed by fiscal period end
+    (oldest first) with revenue/netIncome/operatingIncome/totalAssets/totalEquity.
+    """
+    if statements is None or statements.empty:
+        return None
+    frame = statements.sort_index()
+    years = frame.index.year.to_numpy()
+    revenue = frame["revenue"].to_numpy(dtype=float)
+    net_income = frame["netIncome"].to_numpy(dtype=float)
+    operating_income = frame["operatingIncome"].to_numpy(dtype=float)
+    assets = frame["totalAssets"].to_numpy(dtype=float)
+    equity = frame["totalEquity"].to_numpy(dtype=float)
+
+    series = {
+        "revenueGrowthPct": _clean(_yoy_growth(revenue), 2),
+        "netIncomeGrowthPct": _clean(_yoy_growth(net_income), 2),
+        "operatingMarginPct": _clean(_ratio(operating_income, revenue) * 100, 2),
+        "netMarginPct": _clean(_ratio(net_income, revenue) * 100, 2),
+        # Return on average equity / turnover of average assets
+        "roePct": _clean(_ratio(net_income, _average_with_prior(equity)) * 100, 2),
+        "assetTurnover": _clean(_ratio(revenue, _average_with_prior(assets)), 4),
+    }
+    return {
+        "years": [str(year) for year in years],
+        "series": series,
+        "latest": {"year": str(years[-1]), **{name: values[-1] for name, values in series.items()}},
+        "cagr": {
+            "revenue": _cagr(years, revenue),
+            "netIncome": _cagr(years, net_income),
+        },
+    }
+
+
+def get_derived_fundamentals(company_name: str):
+    """Derived fundamentals for a company from the local financials store"""
+    try:
+        ticker = get_company_ticker(company_name)
+        if not ticker:
+            return None
+        fundamentals = compute_fundamentals(load_statements(ticker))
+        if fundamentals is None:
+            return None
+        return {"ticker": ticker, **fundamentals}
+    except Exception as e:
+        print(f"Error computing fundamentals: {e}")
+        return None
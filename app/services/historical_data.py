@@ -1,207 +1,390 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
-import requests
-from bs4 import BeautifulSoup
-import re
+from app.services.symbol_directory import resolve_ticker
+from app.services.source_cache import cached_source
+from app.services import financials_store
+from app.services.downsample import lttb_indices
 
-HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36"}
+# Monthly bars, reduced to the last close of each calendar year
+HISTORY_INTERVAL = "1mo"
+# Chart resolutions for price series -> yfinance interval
+PRICE_RESOLUTIONS = {
+    "daily": "1d",
+    "weekly": "1wk",
+    "monthly": "1mo",
+}
+# A statement column is matched to the price row nearest in time, within this window
+STATEMENT_MATCH_DAYS = 366
+# How long one loaded yf.Ticker (info + statements) is shared between callers
+TICKER_SHARE_TTL = int(os.getenv("TICKER_SHARE_TTL", "300"))
+TICKER_SHARE_ENTRIES = 64
+
+# yfinance line item -> field name
+HISTORICAL_ROWS = {
+    'Total Revenue': 'revenue',
+    'Net Income': 'netIncome',
+}
+INCOME_ROWS = {
+    **HISTORICAL_ROWS,
+    'Operating Income': 'operatingIncome',
+}
+BALANCE_ROWS = {
+    'Total Assets': 'totalAssets',
+    'Stockholders Equity': 'totalEquity',
+}
+
+
+class TickerData:
+    """
+    One yf.Ticker with its info, statements and price history each loaded at
+    most once, so the historical path and the annual fallback share a load.
+    """
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.stock = yf.Ticker(ticker)
+        self.loaded_at = time.time()
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _load(self, name, load):
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = load()
+            return self._values[name]
+
+    @property
+    def info(self):
+        return self._load("info", lambda: self.stock.info or {})
+
+    @property
+    def income_stmt(self):
+        return self._load("income_stmt", lambda: self.stock.income_stmt)
+
+    @property
+    def balance_sheet(self):
+        return self._load("balance_sheet", lambda: self.stock.balance_sheet)
+
+    def history(self, start_date: datetime, interval: str = HISTORY_INTERVAL):
+        return self._load(
+            ("history", start_date.date(), interval),
+            # Split-adjusted, not dividend-adjusted: matches today's share count
+            # and doesn't drift every time a dividend is paid
+            lambda: self.stock.history(start=start_date, end=datetime.now(), interval=interval, auto_adjust=False),
+        )
+
+
+_tickers = OrderedDict()
+_tickers_lock = threading.Lock()
+
+
+def load_ticker(ticker: str) -> TickerData:
+    """Shared TickerData for `ticker`, reused for TICKER_SHARE_TTL seconds"""
+    with _tickers_lock:
+        data = _tickers.get(ticker)
+        if data is None or time.time() - data.loaded_at > TICKER_SHARE_TTL:
+            data = TickerData(ticker)
+            _tickers[ticker] = data
+        _tickers.move_to_end(ticker)
+        while len(_tickers) > TICKER_SHARE_ENTRIES:
+            _tickers.popitem(last=False)
+        return data
+
+
+def _naive(index) -> pd.DatetimeIndex:
+    index = pd.DatetimeIndex(pd.to_datetime(index))
+    return index.tz_localize(None) if index.tz is not None else index
+
+
+def statement_frame(statement, rows: dict) -> pd.DataFrame:
+    """
+    Fiscal-year columns of a yfinance statement as a frame indexed by period
+    end (oldest first), with the wanted line items as float columns.
+    """
+    columns = list(rows.values())
+    if statement is None or statement.empty:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='period_end'))
+    present = [row for row in rows if row in statement.index]
+    frame = statement.loc[present].T.rename(columns=rows)
+    frame = frame.apply(pd.to_numeric, errors='coerce').reindex(columns=columns)
+    frame.index = _naive(frame.index).rename('period_end')
+    return frame.sort_index()
+
+
+def _records(frame: pd.DataFrame, columns):
+    """Frame rows -> list of dicts with NaN mapped to None"""
+    frame = frame[columns].astype(object)
+    return frame.where(pd.notna(frame), None).to_dict('records')
+
+
+def _yearly_closes(hist: pd.DataFrame) -> pd.DataFrame:
+    """Last close of each calendar year: columns `date`, `close`"""
+    if hist.empty or 'Close' not in hist:
+        return pd.DataFrame({'date': pd.DatetimeIndex([]), 'close': pd.Series(dtype=float)})
+    closes = hist['Close'].dropna()
+    closes.index = _naive(closes.index)
+    yearly = closes.groupby(closes.index.year).tail(1)
+    return pd.DataFrame({'date': yearly.index, 'close': yearly.to_numpy(dtype=float)})
+
+
+def _last_split(splits):
+    """Date of the latest stock split in a 'Stock Splits' column, or None"""
+    if splits is None:
+        return None
+    splits = splits[splits.fillna(0) != 0]
+    return _naive(splits.index).max() if not splits.empty else None
+
+
+def _download_statements(ticker: str) -> pd.DataFrame:
+    data = load_ticker(ticker)
+    income = statement_frame(data.income_stmt, INCOME_ROWS)
+    try:
+        balance = statement_frame(data.balance_sheet, BALANCE_ROWS)
+    except Exception:
+        balance = statement_frame(None, BALANCE_ROWS)
+    return income.join(balance, how='left')
+
+
+def load_prices(ticker: str, years: int) -> pd.DataFrame:
+    """Yearly closes for the last `years` years, downloading only what the local store lacks"""
+    start_date = datetime.now() - timedelta(days=years * 365)
+    try:
+        refresh_from = financials_store.prices_refresh_from(ticker, start_date.year)
+        if refresh_from is not None:
+            # The refresh window starts in the year of the last check, so it sees any split since then
+            hist = load_ticker(ticker).history(max(start_date, datetime(refresh_from, 1, 1)))
+            last_split = _last_split(hist.get('Stock Splits'))
+            if financials_store.split_invalidates(ticker, last_split):
+                financials_store.invalidate_prices(ticker)
+                hist = load_ticker(ticker).history(start_date)
+            financials_store.write_prices(ticker, _yearly_closes(hist), covered_from=start_date.year, last_split=last_split)
+        return financials_store.read_prices(ticker, start_date.year)
+    except sqlite3.Error as e:
+        print(f"✗ Financials store unavailable: {e}")
+        return _yearly_closes(load_ticker(ticker).history(start_date))
+
+
+def _bulk_yearly_closes(tickers, start_date: datetime) -> dict:
+    """One multi-ticker yf.download -> {ticker: (yearly closes frame, latest split date or None)}"""
+    data = yf.download(
+        list(tickers),
+        start=start_date,
+        end=datetime.now(),
+        interval=HISTORY_INTERVAL,
+        group_by='column',
+        auto_adjust=False,
+        actions=True,
+        progress=False,
+        threads=True,
+    )
+    if data is None or data.empty:
+        return {}
+    closes = data['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(tickers[0])
+    splits = data['Stock Splits'] if 'Stock Splits' in data else pd.DataFrame()
+    if isinstance(splits, pd.Series):
+        splits = splits.to_frame(tickers[0])
+    return {
+        ticker: (
+            _yearly_closes(closes[[ticker]].rename(columns={ticker: 'Close'})),
+            _last_split(splits[ticker]) if ticker in splits else None,
+        )
+        for ticker in tickers
+        if ticker in closes
+    }
+
+
+def compare_companies(companies, years: int = 10, metric: str = 'close'):
+    """
+    Aligned year x company matrix of yearly closes (or market caps from the
+    stored share counts). Tickers are resolved locally and every ticker the
+    store can't serve is fetched in a single bulk download.
+    """
+    tickers = {company: get_company_ticker(company) for company in companies}
+    resolved = {company: ticker for company, ticker in tickers.items() if ticker}
+    unique = list(dict.fromkeys(resolved.values()))
+    start_date = datetime.now() - timedelta(days=years * 365)
+    if not unique:
+        return {'years': [], 'companies': [], 'tickers': {}, 'values': [], 'unresolved': list(companies)}
 
-def get_company_ticker(company_name: str):
-    """Try to find stock ticker for a company"""
     try:
-        # Try searching Yahoo Finance
-        search_url = f"https://finance.yahoo.com/quote/{company_name.replace(' ', '%20')}"
-        response = requests.get(search_url, headers=HEADERS, timeout=10)
-        
-        # Try to extract ticker from URL or page
-        if 'quote' in response.url:
-            ticker_match = re.search(r'/quote/([A-Z]+)', response.url)
-            if ticker_match:
-                return ticker_match.group(1)
-        
-        # Common ticker mappings
-        ticker_map = {
-            'microsoft': 'MSFT',
-            'apple': 'AAPL',
-            'google': 'GOOGL',
-            'alphabet': 'GOOGL',
-            'amazon': 'AMZN',
-            'meta': 'META',
-            'facebook': 'META',
-            'tesla': 'TSLA',
-            'nvidia': 'NVDA',
-            'netflix': 'NFLX',
-            'adobe': 'ADBE',
-            'salesforce': 'CRM',
-            'oracle': 'ORCL',
-            'ibm': 'IBM',
-            'intel': 'INTC',
-            'cisco': 'CSCO',
-            'qualcomm': 'QCOM',
+        stale = {}
+        for ticker in unique:
+            refresh_from = financials_store.prices_refresh_from(ticker, start_date.year)
+            if refresh_from is not None:
+                stale[ticker] = refresh_from
+        if stale:
+            # One round trip for every ticker, from the earliest year any of them needs
+            since = max(start_date, datetime(min(stale.values()), 1, 1))
+            downloaded = _bulk_yearly_closes(list(stale), since)
+            # Tickers that split since their last check are refetched over the full range
+            split = [ticker for ticker, (_, last_split) in downloaded.items() if financials_store.split_invalidates(ticker, last_split)]
+            for ticker in split:
+                financials_store.invalidate_prices(ticker)
+            if split and since > start_date:
+                downloaded.update(_bulk_yearly_closes(split, start_date))
+            for ticker, (closes, last_split) in downloaded.items():
+                financials_store.write_prices(ticker, closes, covered_from=start_date.year, last_split=last_split)
+        matrix = financials_store.read_prices_many(unique, start_date.year)
+        shares = financials_store.stored_shares_outstanding(unique) if metric == 'marketCap' else {}
+    except sqlite3.Error as e:
+        print(f"✗ Financials store unavailable: {e}")
+        yearly = _bulk_yearly_closes(unique, start_date)
+        matrix = pd.DataFrame(
+            {ticker: closes.set_index(closes['date'].dt.year)['close'] for ticker, (closes, _) in yearly.items()}
+        ).reindex(columns=unique).sort_index()
+        shares = {}
+
+    if metric == 'marketCap':
+        matrix = matrix * pd.Series(shares, dtype=float).reindex(matrix.columns)
+
+    # Rows = years, columns = companies (in request order)
+    matrix = matrix.reindex(columns=[resolved[company] for company in resolved]).astype(object)
+    matrix = matrix.where(pd.notna(matrix), None)
+    return {
+        'years': [str(year) for year in matrix.index],
+        'companies': list(resolved),
+        'tickers': resolved,
+        'values': matrix.values.tolist(),
+        'unresolved': [company for company in companies if company not in resolved],
+    }
+
+
+def load_shares_outstanding(ticker: str):
+    try:
+        shares, stale = financials_store.shares_outstanding(ticker)
+    except sqlite3.Error as e:
+        print(f"✗ Financials store unavailable: {e}")
+        return load_ticker(ticker).info.get('sharesOutstanding')
+    if stale:
+        shares = load_ticker(ticker).info.get('sharesOutstanding')
+        financials_store.write_shares_outstanding(ticker, shares)
+    return shares
+
+
+def load_statements(ticker: str) -> pd.DataFrame:
+    """Every known fiscal period; statements are only downloaded when a new one may exist"""
+    try:
+        due = financials_store.statements_due(ticker)
+    except sqlite3.Error as e:
+        print(f"✗ Financials store unavailable: {e}")
+        return _download_statements(ticker)
+    if due:
+        try:
+            statements = _download_statements(ticker)
+        except Exception as e:
+            print(f"Error getting financials: {e}")
+        else:
+            financials_store.write_statements(ticker, statements)
+    return financials_store.read_statements(ticker)
+
+
+@cached_source("price_series")
+def get_price_series(company_name: str, years: int = 10, resolution: str = "daily"):
+    """Full-resolution closing prices as columns: {"ticker", "date": [...], "close": [...]}"""
+    try:
+        ticker = get_company_ticker(company_name)
+        if not ticker:
+            return None
+        start_date = datetime.now() - timedelta(days=years * 365)
+        hist = load_ticker(ticker).history(start_date, PRICE_RESOLUTIONS[resolution])
+        if hist.empty or 'Close' not in hist:
+            return None
+        closes = hist['Close'].dropna()
+        return {
+            'ticker': ticker,
+            'date': _naive(closes.index).strftime('%Y-%m-%d').tolist(),
+            'close': closes.round(4).tolist(),
         }
-        
-        company_lower = company_name.lower()
-        for key, ticker in ticker_map.items():
-            if key in company_lower:
-                return ticker
-                
+    except Exception as e:
+        print(f"Error getting price series: {e}")
         return None
+
+
+def downsample_series(series: dict, points: int):
+    """Reduce a columnar price series to at most `points` points (LTTB over date/close)"""
+    dates = pd.to_datetime(series['date'])
+    x = (dates - dates[0]).days.to_numpy() if len(dates) else []
+    keep = lttb_indices(x, series['close'], points)
+    return {
+        **series,
+        'date': [series['date'][i] for i in keep],
+        'close': [series['close'][i] for i in keep],
+    }
+
+
+def get_company_ticker(company_name: str):
+    """Try to find stock ticker for a company (local symbol directory, no network)"""
+    try:
+        return resolve_ticker(company_name)
     except Exception as e:
         print(f"Error finding ticker: {e}")
         return None
 
+@cached_source("historical")
 def get_historical_financial_data(company_name: str, years: int = 10):
     """Get historical financial data for a company"""
     try:
         ticker = get_company_ticker(company_name)
         if not ticker:
             return None
-        
-        # Get stock data
-        stock = yf.Ticker(ticker)
-        
-        # Get historical data for the specified years
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=years * 365)
-        
-        # Get historical stock prices
-        hist = stock.history(start=start_date, end=end_date, interval="1y")
-        
-        if hist.empty:
+
+        # Mostly local reads: only the open period is refreshed from yfinance
+        prices = load_prices(ticker, years)
+        if prices.empty:
             return None
-        
-        # Get financials
+        prices['year'] = prices['date'].dt.year.astype(str)
+
+        # Market cap approximation (price * shares outstanding)
+        try:
+            shares_outstanding = load_shares_outstanding(ticker)
+        except Exception:
+            shares_outstanding = None
+        prices['marketCap'] = prices['close'] * shares_outstanding if shares_outstanding else None
+
+        # Align fiscal-year statement columns to price rows in one as-of join
         try:
-            financials = stock.financials
-            income_stmt = stock.income_stmt
-            
-            # Prepare data
-            data = []
-            for idx, row in hist.iterrows():
-                year = idx.year
-                year_data = {
-                    'year': str(year),
-                    'revenue': None,
-                    'netIncome': None,
-                    'marketCap': None,
-                }
-                
-                # Try to get revenue and net income from financials
-                if not income_stmt.empty:
-                    try:
-                        # Get data for the closest year
-                        for col in income_stmt.columns:
-                            if col.year == year or abs((col.year - year)) <= 1:
-                                if 'Total Revenue' in income_stmt.index:
-                                    revenue = income_stmt.loc['Total Revenue', col]
-                                    if pd.notna(revenue):
-                                        year_data['revenue'] = float(revenue)
-                                if 'Net Income' in income_stmt.index:
-                                    net_income = income_stmt.loc['Net Income', col]
-                                    if pd.notna(net_income):
-                                        year_data['netIncome'] = float(net_income)
-                                break
-                    except Exception:
-                        pass
-                
-                # Market cap approximation (price * shares outstanding)
-                if 'Close' in row and pd.notna(row['Close']):
-                    try:
-                        info = stock.info
-                        shares_outstanding = info.get('sharesOutstanding', 0)
-                        if shares_outstanding:
-                            year_data['marketCap'] = float(row['Close']) * shares_outstanding
-                    except Exception:
-                        pass
-                
-                data.append(year_data)
-            
-            return data
+            statements = load_statements(ticker)[list(HISTORICAL_ROWS.values())]
         except Exception as e:
             print(f"Error getting financials: {e}")
-            # Fallback: just use stock price data
-            data = []
-            for idx, row in hist.iterrows():
-                data.append({
-                    'year': str(idx.year),
-                    'revenue': None,
-                    'netIncome': None,
-                    'marketCap': float(row['Close']) * 1e9 if 'Close' in row and pd.notna(row['Close']) else None,
-                })
-            return data
-            
+            statements = statement_frame(None, HISTORICAL_ROWS)
+        merged = pd.merge_asof(
+            prices,
+            statements.reset_index(),
+            left_on='date',
+            right_on='period_end',
+            direction='nearest',
+            tolerance=pd.Timedelta(days=STATEMENT_MATCH_DAYS),
+        )
+        return _records(merged, ['year', 'revenue', 'netIncome', 'marketCap'])
+
     except Exception as e:
         print(f"Error getting historical data: {e}")
         return None
 
+@cached_source("annual_financials")
 def get_annual_financials(company_name: str):
     """Get annual financial statements"""
     try:
         ticker = get_company_ticker(company_name)
         if not ticker:
             return None
-        
-        stock = yf.Ticker(ticker)
-        
-        # Get financial statements
-        income_stmt = stock.income_stmt
-        balance_sheet = stock.balance_sheet
-        
-        if income_stmt.empty:
+
+        # Served from the local store; when used as the historical fallback any
+        # download reuses the ticker already loaded there
+        annual = load_statements(ticker)
+        if annual.empty:
             return None
-        
-        # Extract annual data
-        annual_data = []
-        for col in income_stmt.columns:
-            year = col.year
-            year_data = {
-                'year': str(year),
-                'revenue': None,
-                'netIncome': None,
-                'operatingIncome': None,
-                'totalAssets': None,
-                'totalEquity': None,
-            }
-            
-            try:
-                if 'Total Revenue' in income_stmt.index:
-                    revenue = income_stmt.loc['Total Revenue', col]
-                    if pd.notna(revenue):
-                        year_data['revenue'] = float(revenue)
-                
-                if 'Net Income' in income_stmt.index:
-                    net_income = income_stmt.loc['Net Income', col]
-                    if pd.notna(net_income):
-                        year_data['netIncome'] = float(net_income)
-                
-                if 'Operating Income' in income_stmt.index:
-                    op_income = income_stmt.loc['Operating Income', col]
-                    if pd.notna(op_income):
-                        year_data['operatingIncome'] = float(op_income)
-            except Exception:
-                pass
-            
-            if not balance_sheet.empty:
-                try:
-                    if 'Total Assets' in balance_sheet.index:
-                        assets = balance_sheet.loc['Total Assets', col]
-                        if pd.notna(assets):
-                            year_data['totalAssets'] = float(assets)
-                    
-                    if 'Stockholders Equity' in balance_sheet.index:
-                        equity = balance_sheet.loc['Stockholders Equity', col]
-                        if pd.notna(equity):
-                            year_data['totalEquity'] = float(equity)
-                except Exception:
-                    pass
-            
-            annual_data.append(year_data)
-        
-        return sorted(annual_data, key=lambda x: x['year'])
-        
+        annual['year'] = annual.index.year.astype(str)
+        return _records(annual, ['year', *INCOME_ROWS.values(), *BALANCE_ROWS.values()])
+
     except Exception as e:
         print(f"Error getting annual financials: {e}")
         return None
-
-
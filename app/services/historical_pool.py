@@ -0,0 +1,111 @@
+"""
+Dedicated worker pool for the blocking yfinance/pandas work behind /historical.
+
+Historical calls run on their own bounded thread pool instead of the event
+loop's default executor, so a slow Yahoo response can only tie up these
+workers -- never the threads chat, plan or research rely on. Concurrent
+calls for the same ticker and options share one execution, the queue is
+bounded (callers get an error instead of piling up), and each call has a
+timeout.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.singleflight import SingleFlight
+
+HISTORICAL_WORKERS = int(os.getenv("HISTORICAL_WORKERS", "4"))
+# Calls waiting for a worker beyond this are rejected
+HISTORICAL_QUEUE_MAX = int(os.getenv("HISTORICAL_QUEUE_MAX", "32"))
+# Seconds a caller waits for a result (a running yfinance call can't be
+# interrupted; it finishes in the background and its worker is then freed)
+HISTORICAL_TIMEOUT = float(os.getenv("HISTORICAL_TIMEOUT", "20"))
+
+_executor = ThreadPoolExecutor(max_workers=HISTORICAL_WORKERS, thread_name_prefix="historical")
+_flight = SingleFlight("historical_pool")
+_lock = threading.Lock()
+_state = {"queued": 0, "running": 0}
+_stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timed_out": 0, "cancelled": 0}
+_durations = {"queue_wait_ms": 0.0, "run_ms": 0.0}
+
+
+class HistoricalPoolBusy(Exception):
+    """Raised when the historical queue is full"""
+
+
+class HistoricalTimeout(Exception):
+    """Raised when a historical call exceeds its timeout"""
+
+
+def _run(fn, args, submitted_at):
+    started = time.perf_counter()
+    with _lock:
+        _state["queued"] -= 1
+        _state["running"] += 1
+        _durations["queue_wait_ms"] += (started - submitted_at) * 1000
+    try:
+        result = fn(*args)
+        with _lock:
+            _stats["completed"] += 1
+        return result
+    except Exception:
+        with _lock:
+            _stats["failed"] += 1
+        raise
+    finally:
+        with _lock:
+            _state["running"] -= 1
+            _durations["run_ms"] += (time.perf_counter() - started) * 1000
+
+
+def _on_done(future):
+    # A call cancelled before a worker picked it up never reaches _run
+    if future.cancelled():
+        with _lock:
+            _state["queued"] -= 1
+            _stats["cancelled"] += 1
+
+
+async def _submit(fn, args, timeout):
+    with _lock:
+        if _state["queued"] >= HISTORICAL_QUEUE_MAX:
+            _stats["rejected"] += 1
+            raise HistoricalPoolBusy(f"historical queue is full ({HISTORICAL_QUEUE_MAX} waiting)")
+        _state["queued"] += 1
+        _stats["submitted"] += 1
+    future = _executor.submit(_run, fn, args, time.perf_counter())
+    future.add_done_callback(_on_done)
+    try:
+        # Cancelling the wrapper also cancels the pool future if it hasn't started
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        with _lock:
+            _stats["timed_out"] += 1
+        raise HistoricalTimeout(f"historical call did not finish within {timeout:g}s")
+
+
+async def run_historical(key: str, fn, *args, timeout: float = None):
+    """
+    Run `fn(*args)` on the historical pool. Calls with the same `key` (built
+    from the resolved ticker and options) that overlap share one execution.
+    """
+    return await _flight.do(key, _submit, fn, args, timeout or HISTORICAL_TIMEOUT)
+
+
+def historical_pool_stats():
+    with _lock:
+        finished = _stats["completed"] + _stats["failed"]
+        return {
+            "workers": HISTORICAL_WORKERS,
+            "queue_max": HISTORICAL_QUEUE_MAX,
+            "timeout_s": HISTORICAL_TIMEOUT,
+            "queue_depth": _state["queued"],
+            "running": _state["running"],
+            "saturation": round(_state["running"] / HISTORICAL_WORKERS, 3),
+            **_stats,
+            "deduplicated": _flight.shared,
+            "avg_queue_wait_ms": round(_durations["queue_wait_ms"] / finished, 1) if finished else None,
+            "avg_run_ms": round(_durations["run_ms"] / finished, 1) if finished else None,
+        }
@@ -0,0 +1,155 @@
+import codecs
+import os
+from html.parser import HTMLParser
+
+from app.services import http_client
+
+# Hard cap on bytes read per page; parsing stops earlier once the scanner has what it needs
+WEBSITE_MAX_BYTES = int(os.getenv("WEBSITE_MAX_BYTES", str(512 * 1024)))
+CHUNK_SIZE = 16 * 1024
+
+
+class PageScanner(HTMLParser):
+    """
+    Incremental HTML scanner fed chunk by chunk. Collects only what the
+    scrapers use (title, meta description, script srcs, about link, first
+    paragraphs, links) and reports `done` once everything requested is found.
+
+    want_head      -> title/description/scripts; done once </head> (or <body>) is seen
+    want_scripts   -> keep collecting script srcs to the end of the document
+                      (frameworks often load theirs at the end of <body>)
+    want_about     -> first link whose href mentions "about"
+    paragraphs     -> text of the first N <p> elements
+    result_class   -> href of the first <a> with this CSS class (search results)
+    links          -> collect up to N (href, text) pairs
+    """
+
+    def __init__(self, want_head=False, want_about=False, paragraphs=0, result_class=None, links=0, want_scripts=False):
+        super().__init__(convert_charrefs=True)
+        self.want_head = want_head
+        self.want_scripts = want_scripts
+        self.want_about = want_about
+        self.paragraph_limit = paragraphs
+        self.result_class = result_class
+        self.link_limit = links
+
+        self.title = None
+        self.description = None
+        self.scripts = []
+        self.about_href = None
+        self.paragraphs = []
+        self.result_href = None
+        self.links = []
+        self.head_done = False
+        self.body_done = False
+
+        self._title_parts = None
+        self._paragraph_parts = None
+        self._link = None
+
+    @property
+    def done(self):
+        if self.result_class and self.result_href is None:
+            return False
+        if self.want_head and not self.head_done:
+            return False
+        if self.want_scripts and not self.body_done:
+            return False
+        if self.want_about and self.about_href is None:
+            return False
+        if self.paragraph_limit and len(self.paragraphs) < self.paragraph_limit:
+            return False
+        if self.link_limit and len(self.links) < self.link_limit:
+            return False
+        return True
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "meta" and self.description is None:
+            name = (attrs.get("name") or attrs.get("property") or "").lower()
+            if name in ("description", "og:description") and attrs.get("content"):
+                self.description = attrs["content"].strip()
+        elif tag == "script" and attrs.get("src"):
+            self.scripts.append(attrs["src"])
+        elif tag == "body":
+            self.head_done = True
+        elif tag == "p" and len(self.paragraphs) < self.paragraph_limit:
+            self._paragraph_parts = []
+
+        if tag in ("a", "link") and attrs.get("href"):
+            href = attrs["href"]
+            if self.want_about and self.about_href is None and "about" in href.lower():
+                self.about_href = href
+            if tag == "a":
+                if self.result_class and self.result_href is None and self.result_class in (attrs.get("class") or "").split():
+                    self.result_href = href
+                if len(self.links) < self.link_limit:
+                    self._link = [href, []]
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None:
+            self.title = " ".join("".join(self._title_parts).split()) or None
+            self._title_parts = None
+        elif tag == "head":
+            self.head_done = True
+        elif tag in ("body", "html"):
+            self.body_done = True
+        elif tag == "p" and self._paragraph_parts is not None:
+            text = " ".join("".join(self._paragraph_parts).split())
+            if text:
+                self.paragraphs.append(text)
+            self._paragraph_parts = None
+        elif tag == "a" and self._link is not None:
+            href, parts = self._link
+            self.links.append((href, " ".join("".join(parts).split())))
+            self._link = None
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        if self._paragraph_parts is not None:
+            self._paragraph_parts.append(data)
+        if self._link is not None:
+            self._link[1].append(data)
+
+
+def scan_url(url: str, scanner: PageScanner, max_bytes: int = None, timeout=8):
+    """
+    Stream `url` into `scanner`, stopping at the byte cap or as soon as the
+    scanner is done. Returns {"url": final_url, "bytes": read, "truncated": bool}.
+    """
+    max_bytes = max_bytes or WEBSITE_MAX_BYTES
+    read = 0
+    truncated = False
+    with http_client.stream("GET", url, timeout=timeout) as response:
+        decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+        for chunk in response.iter_bytes(CHUNK_SIZE):
+            read += len(chunk)
+            scanner.feed(decoder.decode(chunk))
+            if scanner.done:
+                break
+            if read >= max_bytes:
+                truncated = True
+                break
+        final_url = str(response.url)
+    return {"url": final_url, "bytes": read, "truncated": truncated}
+
+
+async def aread_capped(url: str, max_bytes: int = None, timeout=8):
+    """
+    Read at most `max_bytes` of `url` on the async client.
+    Returns (body_bytes, final_url, content_type, encoding).
+    """
+    max_bytes = max_bytes or WEBSITE_MAX_BYTES
+    chunks = []
+    read = 0
+    async with http_client.astream("GET", url, timeout=timeout) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            chunks.append(chunk)
+            read += len(chunk)
+            if read >= max_bytes:
+                break
+        return b"".join(chunks)[:max_bytes], str(response.url), response.headers.get("content-type", ""), response.charset_encoding or "utf-8"
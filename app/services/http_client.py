@@ -0,0 +1,100 @@
+"""
+Shared HTTP clients for every outbound fetcher.
+
+One sync client (used from the worker threads the research pipeline runs
+fetchers on) and one async client, both with per-host keep-alive pools,
+connection limits and consistent timeouts. HTTP/2 is negotiated via ALPN
+when the optional `h2` package is installed and the server supports it.
+"""
+import os
+import threading
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+except ImportError:
+    HTTP2_ENABLED = False
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36"}
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "40"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+DEFAULT_TIMEOUT = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+LIMITS = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+)
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def _client_kwargs():
+    return {
+        "headers": HEADERS,
+        "timeout": DEFAULT_TIMEOUT,
+        "limits": LIMITS,
+        "http2": HTTP2_ENABLED,
+        "follow_redirects": True,
+    }
+
+
+def get_client() -> httpx.Client:
+    """Process-wide sync client (thread safe, connection pooled)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(**_client_kwargs())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Process-wide async client bound to the running event loop"""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**_client_kwargs())
+    return _async_client
+
+
+def _timeout(timeout):
+    return httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT) if timeout else DEFAULT_TIMEOUT
+
+
+def get(url: str, params=None, headers=None, timeout=None) -> httpx.Response:
+    """GET through the shared sync client. `timeout` is the read timeout in seconds."""
+    return get_client().get(url, params=params, headers=headers, timeout=_timeout(timeout))
+
+
+def stream(method: str, url: str, params=None, headers=None, timeout=None):
+    """Streaming request through the shared sync client; use as a context manager"""
+    return get_client().stream(method, url, params=params, headers=headers, timeout=_timeout(timeout))
+
+
+async def aget(url: str, params=None, headers=None, timeout=None) -> httpx.Response:
+    """GET through the shared async client"""
+    return await get_async_client().get(url, params=params, headers=headers, timeout=_timeout(timeout))
+
+
+def astream(method: str, url: str, params=None, headers=None, timeout=None):
+    """Streaming request through the shared async client; use as an async context manager"""
+    return get_async_client().stream(method, url, params=params, headers=headers, timeout=_timeout(timeout))
+
+
+async def close_clients():
+    """Close both shared clients (called on application shutdown)"""
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,168 @@
+"""
+Persistent cache for LLM completions.
+
+Keyed on a hash of the canonicalized prompt plus the model chain and
+sampling parameters, so re-analysing unchanged research data (or
+regenerating the same plan) is a SQLite read instead of a paid call.
+Entries expire after LLM_CACHE_TTL; the table is kept under
+LLM_CACHE_MAX_BYTES by evicting the least recently used completions.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.services.source_cache import CACHE_DB_PATH, get_connection
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 86400)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Expired entries are swept at most this often (seconds)
+SWEEP_INTERVAL = 300
+# Hits refresh last_used at most this often per entry (seconds); LRU order doesn't need more
+TOUCH_INTERVAL = 60
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0, "expired": 0}
+# Running size of the table (this process's view; other workers' writes are
+# picked up whenever _evict rescans) and the time of the last sweep
+_size = {"bytes": None, "swept_at": 0.0}
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(CACHE_DB_PATH)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                completion TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache (last_used)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def canonical_prompt(prompt: str) -> str:
+    """Normalize line endings and trailing whitespace, which don't change what the model sees"""
+    lines = prompt.replace("\r\n", "\n").strip().split("\n")
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def completion_key(prompt: str, **params) -> str:
+    """Hash of the canonical prompt plus model ids and sampling parameters"""
+    payload = json.dumps({"prompt": canonical_prompt(prompt), **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_completion(key: str, bypass: bool = False):
+    """Cached completion text for `key`, or None on a miss / bypass / disabled cache"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    if bypass:
+        _count("bypassed")
+        return None
+    try:
+        conn = _db()
+        row = conn.execute("SELECT completion, created_at, last_used FROM llm_cache WHERE cache_key = ?", (key,)).fetchone()
+        if row is None:
+            _count("misses")
+            return None
+        now = time.time()
+        if now - row[1] > LLM_CACHE_TTL:
+            conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+            conn.commit()
+            _count("expired")
+            _count("misses")
+            return None
+        if now - row[2] > TOUCH_INTERVAL:
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE cache_key = ?", (now, key))
+            conn.commit()
+        _count("hits")
+        return row[0]
+    except sqlite3.Error as e:
+        print(f"✗ LLM cache read failed: {e}")
+        return None
+
+
+def store_completion(key: str, completion: str):
+    if not LLM_CACHE_ENABLED or not completion:
+        return
+    size = len(completion.encode("utf-8"))
+    if size > LLM_CACHE_MAX_BYTES:
+        return
+    now = time.time()
+    try:
+        conn = _db()
+        replaced = conn.execute("SELECT size FROM llm_cache WHERE cache_key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (cache_key, completion, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, completion, size, now, now),
+        )
+        _count("stores")
+        with _stats_lock:
+            if _size["bytes"] is not None:
+                _size["bytes"] += size - (replaced[0] if replaced else 0)
+            due = _size["bytes"] is None or _size["bytes"] > LLM_CACHE_MAX_BYTES or now - _size["swept_at"] > SWEEP_INTERVAL
+        if due:
+            _evict(conn)
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"✗ LLM cache write failed: {e}")
+
+
+def _evict(conn: sqlite3.Connection):
+    """
+    Drop expired entries, then least recently used ones until under
+    LLM_CACHE_MAX_BYTES. Runs only when the running size passes the cap or a
+    sweep is due, and resyncs the running size with the table.
+    """
+    now = time.time()
+    expired = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - LLM_CACHE_TTL,)).rowcount
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+    victims = []
+    if total > LLM_CACHE_MAX_BYTES:
+        for key, size in conn.execute("SELECT cache_key, size FROM llm_cache ORDER BY last_used"):
+            victims.append((key,))
+            total -= size
+            if total <= LLM_CACHE_MAX_BYTES:
+                break
+        conn.executemany("DELETE FROM llm_cache WHERE cache_key = ?", victims)
+    with _stats_lock:
+        _stats["expired"] += expired
+        _stats["evictions"] += len(victims)
+        _size["bytes"] = total
+        _size["swept_at"] = now
+
+
+def llm_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    try:
+        entries, size = _db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+    except sqlite3.Error:
+        entries, size = None, None
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "ttl": LLM_CACHE_TTL,
+        "max_bytes": LLM_CACHE_MAX_BYTES,
+        "entries": entries,
+        "bytes": size,
+        "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else None,
+        **stats,
+    }
@@ -1,6 +1,20 @@
+import asyncio
 import os
+import re
 from dotenv import load_dotenv
 import json
+from app.services.singleflight import SingleFlight, normalize_key, content_hash
+from app.services.llm_cache import completion_key, get_completion, store_completion
+from app.services.llm_router import route_completion, route_stream
+from app.services.context_builder import (
+    CONTEXT_TOKENS_RESEARCH,
+    CONTEXT_TOKENS_PLAN,
+    CONTEXT_TOKENS_CHAT,
+    RESEARCH_PRIORITIES,
+    PLAN_PRIORITIES,
+    build_context,
+)
+from app.services.research_index import build_chat_context
 
 load_dotenv()
 
@@ -19,6 +33,15 @@ A4F_MODEL = os.getenv("A4F_MODEL", "openai/gpt-4o-mini")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
+# Sampling parameters shared by both providers (also part of the completion cache key)
+LLM_TEMPERATURE = 0.7
+LLM_MAX_TOKENS = 4000
+
+# Sections generated per LLM call in parallel plan mode (2 -> six concurrent calls)
+PLAN_SECTION_GROUP_SIZE = max(1, int(os.getenv("PLAN_SECTION_GROUP_SIZE", "2")))
+# Default for the `parallel` flag of /plan/generate
+PLAN_PARALLEL = os.getenv("PLAN_PARALLEL", "false").lower() == "true"
+
 # Initialize clients
 a4f_client = None
 gemini_llm = None
@@ -41,14 +64,16 @@ if USE_GEMINI_FALLBACK and GEMINI_API_KEY:
         gemini_llm = ChatGoogleGenerativeAI(
             model=GEMINI_MODEL,
             google_api_key=GEMINI_API_KEY,
-            temperature=0.7,
-            max_output_tokens=4000
+            temperature=LLM_TEMPERATURE,
+            max_output_tokens=LLM_MAX_TOKENS
         )
         print(f"✓ Gemini fallback initialized with model: {GEMINI_MODEL}")
     except Exception as e:
         print(f"✗ Failed to initialize Gemini fallback: {e}")
         gemini_llm = None
 
+_summary_flight = SingleFlight("research_summary")
+
 HEAVY_PROMPT_TEMPLATE = """
 You are an expert research analyst. Produce a Level-3 deep analysis for the company: {company}.
 
@@ -85,179 +110,430 @@ Produce a structured JSON object with these sections:
 - news_summary: string (3 latest headlines with one-line summary each)
 - subsidiaries: array of strings (from Wikipedia infobox if available)
 
+Growth, CAGR, margins, ROE and asset turnover are precomputed from the annual statements in raw data "fundamentals"; use those values as given for Revenue Growth %, Profit Margin and similar metrics instead of calculating them.
 Make sure numeric_table fields are normalized (use values found, prefer Yahoo -> Wikipedia -> DuckDuckGo). If a numeric value is not available, put null. When you present numbers, keep currency units (USD) where present. Return only JSON.
 """
 
-async def call_llm_with_fallback(prompt: str, use_json_mode: bool = False):
-    """Call LLM with automatic fallback from A4F to Gemini"""
-    
-    # Try A4F first
+def _completion_key(prompt: str, use_json_mode: bool = False):
+    return completion_key(
+        prompt,
+        models=[A4F_MODEL if a4f_client else None, GEMINI_MODEL if gemini_llm else None],
+        temperature=LLM_TEMPERATURE,
+        max_tokens=LLM_MAX_TOKENS,
+        json_mode=use_json_mode,
+    )
+
+async def call_llm_with_fallback(prompt: str, use_json_mode: bool = False, bypass_cache: bool = False, call_class: str = "default",
+                                 cacheable=None):
+    """
+    Call LLM with automatic fallback from A4F to Gemini (with timeouts,
+    circuit breakers and hedging, see llm_router).
+    Completions are cached by prompt, models and sampling parameters;
+    `bypass_cache` skips the lookup (the fresh answer still replaces the entry).
+    `call_class` ("chat", "plan", ...) groups calls of similar length for the
+    router's latency percentiles. `cacheable(content)`, when given, must
+    accept a completion for it to be stored (e.g. the analysis parses).
+    """
+    key = _completion_key(prompt, use_json_mode)
+    # SQLite I/O stays off the event loop
+    cached = await asyncio.to_thread(get_completion, key, bypass_cache)
+    if cached is not None:
+        print("✓ LLM completion served from cache")
+        return cached
+
+    content = await _call_llm_uncached(prompt, call_class)
+    if cacheable is None or cacheable(content):
+        await asyncio.to_thread(store_completion, key, content)
+    return content
+
+def _providers():
+    """(name, call, stream) for each configured provider, in priority order"""
+    providers = []
     if a4f_client:
-        try:
-            print(f"Attempting A4F API with model: {A4F_MODEL}")
-            response = await a4f_client.chat.completions.create(
-                model=A4F_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=4000
-            )
-            print("✓ A4F API call successful")
-            return response.choices[0].message.content
-        except Exception as e:
-            error_msg = str(e)
-            print(f"✗ A4F API failed: {error_msg}")
-            
-            # If it's a model not found error, try to suggest alternatives
-            if "404" in error_msg or "not_found" in error_msg.lower():
-                print(f"Model '{A4F_MODEL}' not found. Try: openai/gpt-4o-mini, openai/gpt-4o, anthropic/claude-3-5-sonnet, or google/gemini-2.0-flash")
-            
-            # Fall through to Gemini fallback
-    
-    # Try Gemini fallback
+        providers.append(("A4F", _call_a4f, _stream_a4f))
     if gemini_llm:
-        try:
-            print(f"Falling back to Gemini with model: {GEMINI_MODEL}")
-            from langchain_core.messages import HumanMessage
-            response = await gemini_llm.ainvoke([HumanMessage(content=prompt)])
-            print("✓ Gemini API call successful")
-            return response.content
-        except Exception as e:
-            print(f"✗ Gemini API also failed: {str(e)}")
-            raise Exception(f"Both A4F and Gemini APIs failed. A4F: {error_msg if 'error_msg' in locals() else 'N/A'}, Gemini: {str(e)}")
-    
-    # No API available
-    raise Exception("No API client available. Please configure A4F_API_KEY or GEMINI_API_KEY in your .env file")
+        providers.append(("Gemini", _call_gemini, _stream_gemini))
+    return providers
+
+def _a4f_hint(error: Exception):
+    # If it's a model not found error, try to suggest alternatives
+    error_msg = str(error)
+    if "404" in error_msg or "not_found" in error_msg.lower():
+        print(f"Model '{A4F_MODEL}' not found. Try: openai/gpt-4o-mini, openai/gpt-4o, anthropic/claude-3-5-sonnet, or google/gemini-2.0-flash")
 
-async def summarize_research_with_numbers(company: str, raw_data: dict):
+async def _call_a4f(prompt: str):
+    try:
+        response = await a4f_client.chat.completions.create(
+            model=A4F_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=LLM_TEMPERATURE,
+            max_tokens=LLM_MAX_TOKENS
+        )
+    except Exception as e:
+        _a4f_hint(e)
+        raise
+    return response.choices[0].message.content
+
+async def _call_gemini(prompt: str):
+    from langchain_core.messages import HumanMessage
+    response = await gemini_llm.ainvoke([HumanMessage(content=prompt)])
+    return response.content
+
+async def _call_llm_uncached(prompt: str, call_class: str = "default"):
+    """A4F first, Gemini on failure or as a hedge when A4F is slower than usual (see llm_router)"""
+    providers = _providers()
+    if not providers:
+        raise Exception("No API client available. Please configure A4F_API_KEY or GEMINI_API_KEY in your .env file")
+    return await route_completion([(name, call) for name, call, _ in providers], prompt, call_class)
+
+async def stream_llm_with_fallback(prompt: str, bypass_cache: bool = False, call_class: str = "default", cacheable=None):
+    """
+    Stream completion text chunks, A4F first then Gemini.
+    Falls back to (or hedges with) Gemini only before A4F's first chunk;
+    a failure after output has started is raised to the caller.
+    Shares the completion cache with call_llm_with_fallback: a cached answer
+    is yielded as a single chunk, and a finished stream is stored (if
+    `cacheable` accepts it).
+    """
+    key = _completion_key(prompt)
+    cached = await asyncio.to_thread(get_completion, key, bypass_cache)
+    if cached is not None:
+        print("✓ LLM completion served from cache")
+        yield cached
+        return
+
+    chunks = []
+    async for delta in _stream_llm_uncached(prompt, call_class):
+        chunks.append(delta)
+        yield delta
+    content = "".join(chunks)
+    if cacheable is None or cacheable(content):
+        await asyncio.to_thread(store_completion, key, content)
+
+async def _stream_a4f(prompt: str):
+    try:
+        stream = await a4f_client.chat.completions.create(
+            model=A4F_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=LLM_TEMPERATURE,
+            max_tokens=LLM_MAX_TOKENS,
+            stream=True
+        )
+    except Exception as e:
+        _a4f_hint(e)
+        raise
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+async def _stream_gemini(prompt: str):
+    from langchain_core.messages import HumanMessage
+    async for chunk in gemini_llm.astream([HumanMessage(content=prompt)]):
+        if chunk.content:
+            yield chunk.content
+
+async def _stream_llm_uncached(prompt: str, call_class: str = "default"):
+    providers = _providers()
+    if not providers:
+        raise Exception("No API client available. Please configure A4F_API_KEY or GEMINI_API_KEY in your .env file")
+    async for delta in route_stream([(name, stream) for name, _, stream in providers], prompt, call_class):
+        yield delta
+
+def build_research_prompt(company: str, raw_data: dict):
+    # Most important fields first, packed into a token budget as compact JSON
+    raw_json = build_context(raw_data, CONTEXT_TOKENS_RESEARCH, RESEARCH_PRIORITIES)
+    return HEAVY_PROMPT_TEMPLATE.format(company=company, raw_json=raw_json)
+
+def _strip_fences(content: str):
+    # Sometimes LLM wraps JSON in markdown code blocks
+    if "```json" in content:
+        return content.split("```json")[1].split("```")[0].strip()
+    if "```" in content:
+        return content.split("```")[1].split("```")[0].strip()
+    return content
+
+def parse_analysis(content: str):
+    """Parse the LLM's JSON analysis, tolerating markdown code fences"""
+    content = _strip_fences(content)
+    try:
+        parsed = json.loads(content)
+        return parsed
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing error: {e}")
+        return {"raw_text": content, "error": "Failed to parse as JSON"}
+
+def analysis_parses(content: str) -> bool:
+    """Whether a research completion parses as the JSON analysis (only those are cached)"""
+    try:
+        json.loads(_strip_fences(content))
+        return True
+    except json.JSONDecodeError:
+        return False
+
+async def summarize_research_with_numbers(company: str, raw_data: dict, bypass_cache: bool = False):
     """Summarize research data and generate structured summary"""
-    raw_json = json.dumps(raw_data, indent=2)[:20000]
-    prompt = HEAVY_PROMPT_TEMPLATE.format(company=company, raw_json=raw_json)
+    # Identical concurrent summaries (same company, same data) share one LLM call
+    key = normalize_key(company, content_hash(raw_data), bypass_cache)
+    return await _summary_flight.do(key, _summarize_research_with_numbers, company, raw_data, bypass_cache)
+
+async def _summarize_research_with_numbers(company: str, raw_data: dict, bypass_cache: bool = False):
+    prompt = build_research_prompt(company, raw_data)
     
     try:
-        content = await call_llm_with_fallback(prompt)
-        
-        # Try to parse as JSON
-        try:
-            # Sometimes LLM wraps JSON in markdown code blocks
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            parsed = json.loads(content)
-            return parsed
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            return {"raw_text": content, "error": "Failed to parse as JSON"}
+        content = await call_llm_with_fallback(
+            prompt, bypass_cache=bypass_cache, call_class="research", cacheable=analysis_parses
+        )
+        return parse_analysis(content)
     except Exception as e:
         error_msg = f"Error calling LLM API: {str(e)}"
         print(error_msg)
         return {"error": error_msg, "raw_data": raw_data}
 
-async def generate_account_plan(company_name: str, research_summary):
-    """Generate account plan using available API with fallback"""
-    
-    prompt = f"""You are an expert strategic account planner. Create a comprehensive, enterprise-grade Account Plan for {company_name} following industry best practices.
-
-Research Data Available:
-{json.dumps(research_summary, indent=2)[:15000]}
-
-Create a detailed Account Plan in markdown format with the following sections:
-
-## 1. Executive Summary
-Provide a high-level overview of the account, its strategic importance, and key opportunities.
-
-## 2. Account Overview & Research
-- Company background and current state
+# The 12 plan sections in order: (title, what the section should cover)
+PLAN_SECTIONS = [
+    ("Executive Summary", """Provide a high-level overview of the account, its strategic importance, and key opportunities."""),
+    ("Account Overview & Research", """- Company background and current state
 - Financial health and performance metrics
 - Market position and competitive landscape
-- Key business units and divisions
-
-## 3. Customer Focus: Goals, Pressures, Initiatives & Obstacles (GPIO)
-Identify and document:
+- Key business units and divisions"""),
+    ("Customer Focus: Goals, Pressures, Initiatives & Obstacles (GPIO)", """Identify and document:
 - **Goals**: What are the customer's primary business objectives?
 - **Pressures**: What external/internal pressures are they facing?
 - **Initiatives**: What strategic initiatives are they pursuing?
-- **Obstacles**: What challenges are blocking their success?
-
-## 4. Target Selection & Sweet Spots
-- Identify the "sweet spot" divisions/business units where you can uniquely deliver value
+- **Obstacles**: What challenges are blocking their success?"""),
+    ("Target Selection & Sweet Spots", '''- Identify the "sweet spot" divisions/business units where you can uniquely deliver value
 - Areas of mutual value creation
 - Prioritized opportunities to target
-- Opportunities to forgo (not aligned with mutual value)
-
-## 5. People & Influence Mapping
-- Key decision makers and their roles
+- Opportunities to forgo (not aligned with mutual value)'''),
+    ("People & Influence Mapping", """- Key decision makers and their roles
 - Influence network and relationships
 - Power structures and political dynamics
 - Champions, influencers, blockers, and gatekeepers
-- Relationship gaps and how to bridge them
-
-## 6. Whitespace Opportunities
-- Untapped potential for cross-sell and up-sell
+- Relationship gaps and how to bridge them"""),
+    ("Whitespace Opportunities", """- Untapped potential for cross-sell and up-sell
 - New areas where your solutions can add value
 - Revenue expansion opportunities within existing relationships
-- Specific whitespace areas to target
-
-## 7. Trust Building Strategy
-- How to position as a "trusted advisor" (not just a vendor)
+- Specific whitespace areas to target"""),
+    ("Trust Building Strategy", '''- How to position as a "trusted advisor" (not just a vendor)
 - Relationship-building activities
 - Value delivery approach
-- Customer problem-solving framework
-
-## 8. Strategies & Activities
-- Long-term strategic approach
+- Customer problem-solving framework'''),
+    ("Strategies & Activities", """- Long-term strategic approach
 - Key activities to execute
 - Collaboration opportunities
-- Team engagement plan
-
-## 9. Action Items & Next Steps
-- Specific, actionable items with owners
+- Team engagement plan"""),
+    ("Action Items & Next Steps", """- Specific, actionable items with owners
 - Timeline and milestones
 - Immediate next steps (next 30/60/90 days)
-- Regular review cadence
-
-## 10. Success Metrics & KPIs
-- Key performance indicators to track
+- Regular review cadence"""),
+    ("Success Metrics & KPIs", """- Key performance indicators to track
 - Revenue targets and growth metrics
 - Relationship health indicators
-- Whitespace conversion metrics
-
-## 11. Risks & Mitigation
-- Potential risks to the account relationship
+- Whitespace conversion metrics"""),
+    ("Risks & Mitigation", """- Potential risks to the account relationship
 - Competitive threats
 - Internal challenges
-- Mitigation strategies
-
-## 12. Account Team & Resources
-- Recommended team structure
+- Mitigation strategies"""),
+    ("Account Team & Resources", """- Recommended team structure
 - Resource allocation
 - Executive sponsorship needs
-- Support requirements
+- Support requirements"""),
+]
 
-**Important Guidelines:**
+PLAN_GUIDELINES = """**Important Guidelines:**
 - Focus on becoming a trusted advisor, not just closing deals
 - Emphasize mutual value creation
 - Be specific and actionable
 - Use insights from the research data provided
 - Think long-term relationship building
 - Identify whitespace opportunities
-- Make it collaborative and team-oriented
+- Make it collaborative and team-oriented"""
+
+def _plan_section_markdown(numbers):
+    return "\n\n".join(f"## {n}. {PLAN_SECTIONS[n - 1][0]}\n{PLAN_SECTIONS[n - 1][1]}" for n in numbers)
+
+def _plan_context(research_summary):
+    return build_context(research_summary, CONTEXT_TOKENS_PLAN, PLAN_PRIORITIES)
+
+def build_account_plan_prompt(company_name: str, research_summary):
+    return f"""You are an expert strategic account planner. Create a comprehensive, enterprise-grade Account Plan for {company_name} following industry best practices.
+
+Research Data Available:
+{_plan_context(research_summary)}
+
+Create a detailed Account Plan in markdown format with the following sections:
+
+{_plan_section_markdown(range(1, len(PLAN_SECTIONS) + 1))}
+
+{PLAN_GUIDELINES}
 
 Format the output as clean markdown with clear section headers. Make it professional, strategic, and immediately actionable for the sales team.
 """
+
+def build_plan_sections_prompt(company_name: str, research_context: str, numbers, current: str = None, instructions: str = None):
+    """Prompt for only the given sections (1-based numbers) of the account plan"""
+    headers = ", ".join(f"## {n}. {PLAN_SECTIONS[n - 1][0]}" for n in numbers)
+    outline = "\n".join(f"{n}. {title}" for n, (title, _) in enumerate(PLAN_SECTIONS, 1))
+    revision = ""
+    if current:
+        revision += f"\nCurrent version of this content (revise and improve it):\n{current}\n"
+    if instructions:
+        revision += f"\nUser instructions for this revision: {instructions}\n"
+    return f"""You are an expert strategic account planner. You are writing part of a comprehensive, enterprise-grade Account Plan for {company_name} following industry best practices.
+
+Research Data Available:
+{research_context}
+
+The full plan has these sections, written separately:
+{outline}
+
+Write ONLY the following section(s) in markdown, do not repeat the other sections:
+
+{_plan_section_markdown(numbers)}
+{revision}
+{PLAN_GUIDELINES}
+
+Start each section with its exact header ({headers}) and output nothing before or after them. Make it professional, strategic, and immediately actionable for the sales team.
+"""
+
+def find_plan_section(name) -> int:
+    """1-based section number for a number ("5"), title or slug ("whitespace-opportunities"); None if unknown"""
+    text = str(name).strip().lower()
+    if text.isdigit():
+        number = int(text)
+        return number if 1 <= number <= len(PLAN_SECTIONS) else None
+    wanted = re.sub(r"[^a-z0-9]+", " ", text).strip()
+    for number, (title, _) in enumerate(PLAN_SECTIONS, 1):
+        words = re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+        if wanted == words or (wanted and words.startswith(wanted)):
+            return number
+    return None
+
+_SECTION_HEADER = re.compile(r"^##\s*(\d+)\.", re.M)
+
+def split_plan_sections(plan: str):
+    """{section number: markdown} for a generated plan, split on its '## n.' headers"""
+    matches = list(_SECTION_HEADER.finditer(plan or ""))
+    return {
+        int(match.group(1)): plan[match.start():matches[i + 1].start() if i + 1 < len(matches) else len(plan)].strip()
+        for i, match in enumerate(matches)
+    }
+
+def _plan_preamble(plan: str):
+    """Text before the first section header (the "# Account Plan" title and intro)"""
+    match = _SECTION_HEADER.search(plan or "")
+    return plan[:match.start()].strip() if match else ""
+
+def _with_section_header(number: int, content: str):
+    """One section's markdown, adding its '## n.' header if the model left it off"""
+    content = content.strip()
+    section = split_plan_sections(content).get(number)
+    if section is not None:
+        return section
+    return f"## {number}. {PLAN_SECTIONS[number - 1][0]}\n\n{content}"
+
+def _assemble_plan(sections: dict, preamble: str = ""):
+    parts = [preamble] if preamble else []
+    return "\n\n".join(parts + [sections[n] for n in sorted(sections)])
+
+async def generate_account_plan(company_name: str, research_summary, bypass_cache: bool = False):
+    """Generate account plan using available API with fallback"""
+    prompt = build_account_plan_prompt(company_name, research_summary)
     
     try:
-        return await call_llm_with_fallback(prompt)
+        return await call_llm_with_fallback(prompt, bypass_cache=bypass_cache, call_class="plan")
     except Exception as e:
         return f"Error generating account plan: {str(e)}"
 
-async def chat_with_research(company_name: str, research_data: dict, question: str):
-    """Interactive chat that uses research data to answer questions"""
-    
-    research_summary = json.dumps(research_data, indent=2)[:10000]
+async def stream_account_plan(company_name: str, research_summary, bypass_cache: bool = False):
+    """Account plan markdown chunks as the model writes them (same fallback rules as stream_llm_with_fallback)"""
+    prompt = build_account_plan_prompt(company_name, research_summary)
+    async for delta in stream_llm_with_fallback(prompt, bypass_cache=bypass_cache, call_class="plan"):
+        yield delta
+
+def _plan_section_error(number: int, message: str):
+    return f"## {number}. {PLAN_SECTIONS[number - 1][0]}\n\n_Error generating this section: {message}_"
+
+async def _generate_plan_group(company_name: str, research_context: str, numbers, bypass_cache: bool):
+    prompt = build_plan_sections_prompt(company_name, research_context, numbers)
+    try:
+        content = await call_llm_with_fallback(prompt, bypass_cache=bypass_cache, call_class="plan_section")
+    except Exception as e:
+        return {n: _plan_section_error(n, str(e)) for n in numbers}
+    sections = {n: markdown for n, markdown in split_plan_sections(content).items() if n in numbers}
+    if len(numbers) == 1 and not sections and content.strip():
+        # A lone section written without its header: add the header
+        return {numbers[0]: _with_section_header(numbers[0], content)}
+    missing = [n for n in numbers if n not in sections]
+    if len(numbers) > 1 and missing:
+        # The model dropped or garbled some headers: ask for those sections one at a time
+        retried = await asyncio.gather(
+            *(_generate_plan_group(company_name, research_context, [n], bypass_cache) for n in missing)
+        )
+        for result in retried:
+            sections.update(result)
+    for n in missing:
+        sections.setdefault(n, _plan_section_error(n, "the model returned no content for it"))
+    return sections
+
+async def iter_account_plan_sections(company_name: str, research_summary, bypass_cache: bool = False):
+    """
+    Generate the plan as concurrent calls of PLAN_SECTION_GROUP_SIZE sections
+    each, sharing one packed research context. Yields {number: markdown} per
+    group as it finishes (not in plan order).
+    """
+    research_context = await asyncio.to_thread(_plan_context, research_summary)
+    numbers = list(range(1, len(PLAN_SECTIONS) + 1))
+    groups = [numbers[i:i + PLAN_SECTION_GROUP_SIZE] for i in range(0, len(numbers), PLAN_SECTION_GROUP_SIZE)]
+    tasks = [
+        asyncio.ensure_future(_generate_plan_group(company_name, research_context, group, bypass_cache))
+        for group in groups
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def generate_account_plan_parallel(company_name: str, research_summary, bypass_cache: bool = False):
+    """Same plan as generate_account_plan, with sections generated concurrently and assembled in order"""
+    sections = {}
+    async for group in iter_account_plan_sections(company_name, research_summary, bypass_cache):
+        sections.update(group)
+    return _assemble_plan(sections)
+
+async def regenerate_plan_section(company_name: str, research_summary, number: int, account_plan: str = None,
+                                  instructions: str = None, bypass_cache: bool = True):
+    """
+    Rewrite one section. Returns (section markdown, updated plan); the plan is
+    None when no `account_plan` was given to splice the section into.
+    """
+    current = split_plan_sections(account_plan).get(number) if account_plan else None
+    research_context = await asyncio.to_thread(_plan_context, research_summary)
+    prompt = build_plan_sections_prompt(company_name, research_context, [number], current, instructions)
+    content = await call_llm_with_fallback(prompt, bypass_cache=bypass_cache, call_class="plan_section")
+    # Keep only this section if the model wrote more than asked, and add its
+    # header if it wrote none, so the spliced plan still splits on it
+    content = _with_section_header(number, content)
+
+    if not account_plan:
+        return content, None
+    sections = split_plan_sections(account_plan)
+    if not sections:
+        return content, None
+    sections[number] = content
+    return content, _assemble_plan(sections, _plan_preamble(account_plan))
+
+def build_chat_prompt(company_name: str, research_data: dict, question: str, research_id: str = None):
+    # Only the chunks relevant to this question (BM25 over the indexed research) plus the numbers.
+    # Stored research is indexed under its research_id, so it isn't re-hashed every turn
+    research_summary = build_chat_context(research_data, question, CONTEXT_TOKENS_CHAT, key=research_id)
     
-    prompt = f"""You are an AI research assistant helping analyze {company_name}. 
+    return f"""You are an AI research assistant helping analyze {company_name}. 
 
 Research Data Available:
 {research_summary}
@@ -266,8 +542,19 @@ User Question: {question}
 
 Provide a helpful, accurate answer based on the research data. If you find conflicting information, mention it. If you need more information, suggest what to investigate further. Be conversational and helpful.
 """
+
+async def chat_with_research(company_name: str, research_data: dict, question: str, bypass_cache: bool = False, research_id: str = None):
+    """Interactive chat that uses research data to answer questions"""
     
     try:
-        return await call_llm_with_fallback(prompt)
+        # Indexing the research on first use is CPU work; keep it off the event loop
+        prompt = await asyncio.to_thread(build_chat_prompt, company_name, research_data, question, research_id)
+        return await call_llm_with_fallback(prompt, bypass_cache=bypass_cache, call_class="chat")
     except Exception as e:
         return f"I apologize, but I encountered an error: {str(e)}. Please try again."
+
+async def stream_chat_with_research(company_name: str, research_data: dict, question: str, bypass_cache: bool = False, research_id: str = None):
+    """Chat answer chunks as the model writes them"""
+    prompt = await asyncio.to_thread(build_chat_prompt, company_name, research_data, question, research_id)
+    async for delta in stream_llm_with_fallback(prompt, bypass_cache=bypass_cache, call_class="chat"):
+        yield delta
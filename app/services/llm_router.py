@@ -0,0 +1,333 @@
+"""
+Latency-aware routing across LLM providers.
+
+Every provider (A4F, Gemini) keeps a rolling window of latencies and
+outcomes. A provider that keeps failing has its circuit opened: it is
+skipped without being called until LLM_BREAKER_COOLDOWN has passed, then a
+single probe call decides whether it closes again.
+
+Each attempt is bounded by LLM_TIMEOUT. If the first provider hasn't
+answered (or, when streaming, produced its first token) by its own rolling
+p90 latency, a hedged request is sent to the next provider and whichever
+answers first wins; the other is cancelled. A provider that fails before
+the deadline hands over to the next one immediately.
+
+Latencies are kept per call class (chat answer, research analysis, full
+plan, plan section...), since a short chat completion says nothing about
+how long a 4000-token plan should take.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+
+# Seconds an attempt may take (for streams: until the first token)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "90"))
+# "priority": configured order (A4F, then Gemini); "latency": fastest rolling median first
+LLM_ROUTING = os.getenv("LLM_ROUTING", "priority").lower()
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+# Hedge delay until a provider has enough samples for a percentile
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Calls remembered per provider for latency percentiles and error rate
+WINDOW = 50
+MIN_SAMPLES = 5
+# Error rate only trips the breaker once there are this many outcomes
+BREAKER_MIN_OUTCOMES = 10
+
+
+class ProviderHealth:
+    """Rolling latency/error window and circuit breaker for one provider"""
+
+    def __init__(self, name: str):
+        self.name = name
+        # "call:<class>" = full completion, "first_token:<class>" = streaming time to first token
+        self.latencies = {}
+        self.outcomes = deque(maxlen=WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.counts = {
+            "attempts": 0, "successes": 0, "failures": 0, "timeouts": 0,
+            "hedges": 0, "hedge_wins": 0, "cancelled": 0, "short_circuited": 0, "breaker_opens": 0,
+        }
+
+    def percentile(self, kind: str, q: float):
+        samples = sorted(self.latencies.get(kind, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(q / 100 * len(samples)) - 1)]
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN else "open"
+
+    def allow(self) -> bool:
+        """Whether to call this provider now; a half-open circuit lets one probe through"""
+        state = self.state()
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        self.counts["short_circuited"] += 1
+        return False
+
+    def hedge_delay(self, kind: str):
+        p = self.percentile(kind, LLM_HEDGE_PERCENTILE)
+        return min(max(p if p is not None else LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY), LLM_TIMEOUT)
+
+    def observe(self, kind: str, seconds: float):
+        self.latencies.setdefault(kind, deque(maxlen=WINDOW)).append(seconds)
+
+    def observe_cancelled(self, kind: str, seconds: float):
+        """
+        A cancelled attempt took at least `seconds`. Recorded only once the
+        class has a percentile and `seconds` has reached the hedge delay, so
+        slow losers keep the tail honest; shorter ones (a client leaving after
+        0.2s) say nothing about it and would pull the hedge deadline down.
+        """
+        if self.percentile(kind, LLM_HEDGE_PERCENTILE) is not None and seconds >= self.hedge_delay(kind):
+            self.observe(kind, seconds)
+
+    def succeeded(self):
+        self.counts["successes"] += 1
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.opened_at is not None:
+            print(f"✓ {self.name} circuit closed")
+            self.opened_at = None
+            self.probing = False
+            self.outcomes.clear()
+
+    def failed(self, timeout: bool = False):
+        self.counts["failures"] += 1
+        if timeout:
+            self.counts["timeouts"] += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        tripped = self.consecutive_failures >= LLM_BREAKER_FAILURES or (
+            len(self.outcomes) >= BREAKER_MIN_OUTCOMES and self.error_rate() >= LLM_BREAKER_ERROR_RATE
+        )
+        if self.probing or (self.opened_at is None and tripped):
+            print(f"✗ {self.name} circuit opened for {LLM_BREAKER_COOLDOWN:g}s")
+            self.opened_at = time.monotonic()
+            self.probing = False
+            self.counts["breaker_opens"] += 1
+
+    def abandoned(self):
+        """An attempt was cancelled (lost a hedge race, or the caller went away)"""
+        self.counts["cancelled"] += 1
+        self.probing = False
+
+    def stats(self):
+        latency = {}
+        for kind, samples in sorted(self.latencies.items()):
+            median = self.percentile(kind, 50)
+            p90 = self.percentile(kind, 90)
+            latency[kind] = {
+                "samples": len(samples),
+                "p50_ms": round(median * 1000) if median is not None else None,
+                "p90_ms": round(p90 * 1000) if p90 is not None else None,
+                "hedge_delay_ms": round(self.hedge_delay(kind) * 1000),
+            }
+        return {
+            "state": self.state(),
+            "error_rate": round(self.error_rate(), 3),
+            "consecutive_failures": self.consecutive_failures,
+            "latency": latency,
+            **self.counts,
+        }
+
+
+_health = {}
+
+
+def provider_health(name: str) -> ProviderHealth:
+    if name not in _health:
+        _health[name] = ProviderHealth(name)
+    return _health[name]
+
+
+def _ordered(providers, kind: str):
+    if LLM_ROUTING != "latency":
+        return list(providers)
+    # Providers without enough samples yet sort first so they get measured
+    return sorted(providers, key=lambda provider: provider_health(provider[0]).percentile(kind, 50) or 0.0)
+
+
+class _Race:
+    """Attempts across providers in routing order, with fallback on failure and one hedge per attempt"""
+
+    def __init__(self, providers, kind: str):
+        self.kind = kind
+        self.queue = iter(_ordered(providers, kind))
+        self.pending = {}
+        self.errors = []
+        self.hedge_at = None
+
+    def launch(self, start, hedge: bool = False):
+        """Start the next provider whose circuit allows it; False when none is left"""
+        for name, fn in self.queue:
+            health = provider_health(name)
+            if not health.allow():
+                self.errors.append(f"{name}: circuit open")
+                continue
+            health.counts["attempts"] += 1
+            if hedge:
+                health.counts["hedges"] += 1
+                print(f"↻ Hedging LLM request to {name}")
+            task, context = start(fn)
+            self.pending[task] = (name, time.monotonic(), hedge, context)
+            self.hedge_at = time.monotonic() + health.hedge_delay(self.kind) if LLM_HEDGE_ENABLED else None
+            return True
+        return False
+
+    async def next_done(self, start):
+        """Wait for an attempt to finish, firing a hedge if the deadline passes first"""
+        while True:
+            timeout = None if self.hedge_at is None else max(self.hedge_at - time.monotonic(), 0)
+            done, _ = await asyncio.wait(self.pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if done:
+                task = done.pop()
+                return task, self.pending.pop(task)
+            self.hedge_at = None
+            self.launch(start, hedge=True)
+
+    def failed(self, name: str, error: Exception):
+        timeout = isinstance(error, asyncio.TimeoutError)
+        provider_health(name).failed(timeout=timeout)
+        message = f"timed out after {LLM_TIMEOUT:g}s" if timeout else str(error)
+        print(f"✗ {name} failed: {message}")
+        self.errors.append(f"{name}: {message}")
+
+    def error(self):
+        return Exception("All LLM providers failed. " + "; ".join(self.errors))
+
+    def cancel_pending(self):
+        """Cancel attempts still running; returns their (task, context) pairs"""
+        cancelled = []
+        now = time.monotonic()
+        for task, (name, started, _, context) in self.pending.items():
+            task.cancel()
+            health = provider_health(name)
+            health.abandoned()
+            health.observe_cancelled(self.kind, now - started)
+            cancelled.append((task, context))
+        self.pending.clear()
+        return cancelled
+
+
+async def route_completion(providers, prompt: str, call_class: str = "default") -> str:
+    """
+    Completion text from the first provider to answer. `providers` is a list of
+    (name, async fn(prompt) -> str) in configured priority order; `call_class`
+    selects the latency window the hedge deadline comes from.
+    """
+    race = _Race(providers, f"call:{call_class}")
+
+    def start(fn):
+        return asyncio.ensure_future(asyncio.wait_for(fn(prompt), LLM_TIMEOUT)), None
+
+    try:
+        race.launch(start)
+        while race.pending:
+            task, (name, started, hedge, _) = await race.next_done(start)
+            try:
+                result = task.result()
+            except Exception as e:
+                race.failed(name, e)
+                if not race.pending:
+                    race.launch(start)
+                continue
+            health = provider_health(name)
+            health.observe(race.kind, time.monotonic() - started)
+            health.succeeded()
+            if hedge:
+                health.counts["hedge_wins"] += 1
+            print(f"✓ {name} API call successful")
+            return result
+    finally:
+        race.cancel_pending()
+    raise race.error()
+
+
+async def route_stream(providers, prompt: str, call_class: str = "default"):
+    """
+    Stream chunks from the first provider to produce a token. `providers` is a
+    list of (name, fn(prompt) -> async iterator of str). Hedging and fallback
+    apply until the first token; a failure after that is raised to the caller.
+    """
+    race = _Race(providers, f"first_token:{call_class}")
+
+    def start(fn):
+        stream = fn(prompt).__aiter__()
+        return asyncio.ensure_future(asyncio.wait_for(stream.__anext__(), LLM_TIMEOUT)), stream
+
+    winner = None
+    try:
+        race.launch(start)
+        while race.pending:
+            task, (name, started, hedge, stream) = await race.next_done(start)
+            try:
+                first = task.result()
+            except StopAsyncIteration:
+                first = None
+            except Exception as e:
+                await stream.aclose()
+                race.failed(name, e)
+                if not race.pending:
+                    race.launch(start)
+                continue
+            winner = (name, stream)
+            health = provider_health(name)
+            health.observe(race.kind, time.monotonic() - started)
+            if hedge:
+                health.counts["hedge_wins"] += 1
+            break
+    finally:
+        # A stream can only be closed once its cancelled __anext__ has unwound
+        for task, stream in race.cancel_pending():
+            await asyncio.gather(task, return_exceptions=True)
+            await stream.aclose()
+
+    if winner is None:
+        raise race.error()
+
+    name, stream = winner
+    health = provider_health(name)
+    try:
+        if first is not None:
+            yield first
+            async for delta in stream:
+                yield delta
+    except (GeneratorExit, asyncio.CancelledError):
+        health.abandoned()
+        raise
+    except Exception:
+        health.failed()
+        raise
+    finally:
+        await stream.aclose()
+    health.succeeded()
+    print(f"✓ {name} streaming call successful")
+
+
+def llm_router_stats():
+    return {
+        "routing": LLM_ROUTING,
+        "timeout_s": LLM_TIMEOUT,
+        "hedge_enabled": LLM_HEDGE_ENABLED,
+        "hedge_percentile": LLM_HEDGE_PERCENTILE,
+        "providers": {name: health.stats() for name, health in _health.items()},
+    }
@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote_plus
+
+from app.services import http_client
+from app.services.source_cache import CACHE_DB_PATH, get_connection
+
+NEWS_POLLER_ENABLED = os.getenv("NEWS_POLLER_ENABLED", "true").lower() == "true"
+# How often each tracked company's feed is re-polled
+NEWS_POLL_INTERVAL = int(os.getenv("NEWS_POLL_INTERVAL", "600"))
+# Stop parsing a feed after this many new items, or this many already-known items in a row
+NEWS_FRESH_ITEMS = int(os.getenv("NEWS_FRESH_ITEMS", "20"))
+NEWS_KNOWN_STREAK = int(os.getenv("NEWS_KNOWN_STREAK", "5"))
+# Headlines whose 64-bit simhashes differ in at most this many bits are the same story
+NEWS_SIMHASH_DISTANCE = int(os.getenv("NEWS_SIMHASH_DISTANCE", "3"))
+# Companies nobody has asked about for this long stop being polled
+NEWS_UNTRACK_AFTER = int(os.getenv("NEWS_UNTRACK_AFTER", str(7 * 86400)))
+# Stored stories older than this are deleted
+NEWS_RETENTION = int(os.getenv("NEWS_RETENTION", str(30 * 86400)))
+NEWS_POLL_CONCURRENCY = int(os.getenv("NEWS_POLL_CONCURRENCY", "4"))
+NEWS_FEED_URL = "https://news.google.com/rss/search?q={query}"
+
+_local = threading.local()
+_poller_task = None
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(CACHE_DB_PATH)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS news_tracked (
+                company_key TEXT PRIMARY KEY,
+                company TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                last_requested REAL NOT NULL,
+                last_polled REAL NOT NULL DEFAULT 0,
+                etag TEXT,
+                last_modified TEXT
+            )"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS news_items (
+                company_key TEXT NOT NULL,
+                fingerprint INTEGER NOT NULL,
+                title TEXT,
+                link TEXT,
+                published TEXT,
+                published_ts REAL,
+                publisher TEXT,
+                duplicates INTEGER NOT NULL DEFAULT 0,
+                duplicate_links TEXT NOT NULL DEFAULT '',
+                ingested_at REAL NOT NULL,
+                PRIMARY KEY (company_key, fingerprint)
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_news_items_recent ON news_items (company_key, published_ts DESC)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def company_key(company: str) -> str:
+    return " ".join(company.lower().split())
+
+
+# -------------------------
+# Near-duplicate fingerprints
+# -------------------------
+def _headline_tokens(title: str):
+    # Google News appends " - Publisher"; syndicated copies differ mainly there
+    title = re.sub(r"\s+[-|–]\s+[^-|–]+$", "", title or "")
+    words = re.findall(r"[a-z0-9]+", title.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def simhash(title: str) -> int:
+    """64-bit simhash of a headline (unigram + bigram features)"""
+    weights = [0] * 64
+    for token in _headline_tokens(title):
+        h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+
+# -------------------------
+# Feed ingestion
+# -------------------------
+def _iter_feed_items(response):
+    """Yield RSS <item>s as dicts while the body streams in"""
+    parser = ET.XMLPullParser(events=("end",))
+    for chunk in response.iter_bytes(16 * 1024):
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            if element.tag != "item":
+                continue
+            source = element.find("source")
+            yield {
+                "title": element.findtext("title"),
+                "link": element.findtext("link"),
+                "published": element.findtext("pubDate"),
+                "publisher": source.text if source is not None else None,
+            }
+            element.clear()
+
+
+def _published_ts(published):
+    try:
+        return parsedate_to_datetime(published).timestamp()
+    except Exception:
+        return None
+
+
+def ingest_company_news(company: str):
+    """
+    Poll one company's feed into the store. Sends the stored validators,
+    stops reading after NEWS_FRESH_ITEMS new items (or a streak of known
+    ones), and folds near-duplicate headlines into the existing story.
+    Returns the number of new stories stored.
+    """
+    key = company_key(company)
+    conn = _db()
+    row = conn.execute("SELECT etag, last_modified FROM news_tracked WHERE company_key = ?", (key,)).fetchone()
+    headers = {}
+    if row and row[0]:
+        headers["If-None-Match"] = row[0]
+    if row and row[1]:
+        headers["If-Modified-Since"] = row[1]
+
+    # fingerprint -> every link already seen for that story
+    known = {
+        fp: {link} | set(filter(None, duplicate_links.split("\n")))
+        for fp, link, duplicate_links in conn.execute(
+            "SELECT fingerprint, link, duplicate_links FROM news_items WHERE company_key = ?", (key,)
+        )
+    }
+    added = 0
+    known_streak = 0
+    now = time.time()
+    url = NEWS_FEED_URL.format(query=quote_plus(company))
+    with http_client.stream("GET", url, headers=headers or None) as response:
+        if response.status_code == 304:
+            conn.execute("UPDATE news_tracked SET last_polled = ? WHERE company_key = ?", (now, key))
+            conn.commit()
+            return 0
+        response.raise_for_status()
+        for item in _iter_feed_items(response):
+            if not item["title"]:
+                continue
+            fingerprint = simhash(item["title"])
+            match = next((fp for fp in known if _distance(fp, fingerprint) <= NEWS_SIMHASH_DISTANCE), None)
+            if match is not None:
+                if item["link"] not in known[match]:
+                    # Syndicated copy of a story we already have
+                    known[match].add(item["link"])
+                    conn.execute(
+                        "UPDATE news_items SET duplicates = duplicates + 1, duplicate_links = duplicate_links || ? WHERE company_key = ? AND fingerprint = ?",
+                        ((item["link"] or "") + "\n", key, match),
+                    )
+                else:
+                    # Exactly what a previous poll already read: we're caught up
+                    known_streak += 1
+                    if known_streak >= NEWS_KNOWN_STREAK:
+                        break
+                continue
+            known_streak = 0
+            conn.execute(
+                "INSERT OR IGNORE INTO news_items (company_key, fingerprint, title, link, published, published_ts, publisher, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, fingerprint, item["title"], item["link"], item["published"], _published_ts(item["published"]), item["publisher"], now),
+            )
+            known[fingerprint] = {item["link"]}
+            added += 1
+            if added >= NEWS_FRESH_ITEMS:
+                break
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+
+    conn.execute(
+        "UPDATE news_tracked SET last_polled = ?, etag = ?, last_modified = ? WHERE company_key = ?",
+        (now, etag, last_modified, key),
+    )
+    conn.commit()
+    return added
+
+
+# -------------------------
+# Store access
+# -------------------------
+def track_company(company: str):
+    """Start (or keep) polling news for `company`"""
+    now = time.time()
+    conn = _db()
+    conn.execute(
+        """INSERT INTO news_tracked (company_key, company, added_at, last_requested) VALUES (?, ?, ?, ?)
+           ON CONFLICT(company_key) DO UPDATE SET last_requested = excluded.last_requested""",
+        (company_key(company), company, now, now),
+    )
+    conn.commit()
+
+
+def read_news(company: str, limit: int = 10):
+    """
+    Latest stored stories for a tracked company, newest first, or None if the
+    company isn't tracked yet or its feed hasn't been polled recently.
+    Every read counts as a request, so companies served from the store keep
+    being polled.
+    """
+    key = company_key(company)
+    conn = _db()
+    now = time.time()
+    row = conn.execute("SELECT last_polled, last_requested FROM news_tracked WHERE company_key = ?", (key,)).fetchone()
+    if not row:
+        return None
+    # At most one write per poll interval, not one per read
+    if now - row[1] > NEWS_POLL_INTERVAL:
+        conn.execute("UPDATE news_tracked SET last_requested = ? WHERE company_key = ?", (now, key))
+        conn.commit()
+    if now - row[0] > 2 * NEWS_POLL_INTERVAL:
+        return None
+    rows = conn.execute(
+        """SELECT title, link, published, publisher, duplicates FROM news_items
+           WHERE company_key = ? ORDER BY COALESCE(published_ts, ingested_at) DESC LIMIT ?""",
+        (key, limit),
+    ).fetchall()
+    return [
+        {"title": title, "link": link, "published": published, "publisher": publisher, "duplicates": duplicates}
+        for title, link, published, publisher, duplicates in rows
+    ]
+
+
+def news_store_stats():
+    conn = _db()
+    tracked = conn.execute("SELECT COUNT(*) FROM news_tracked").fetchone()[0]
+    stories, duplicates = conn.execute("SELECT COUNT(*), COALESCE(SUM(duplicates), 0) FROM news_items").fetchone()
+    return {
+        "poller_running": _poller_task is not None,
+        "tracked_companies": tracked,
+        "stories": stories,
+        "duplicates_collapsed": duplicates,
+    }
+
+
+def _claim_due_companies():
+    """Companies due for a poll; claiming updates last_polled so other workers skip them"""
+    now = time.time()
+    conn = _db()
+    conn.execute("DELETE FROM news_tracked WHERE last_requested < ?", (now - NEWS_UNTRACK_AFTER,))
+    conn.execute("DELETE FROM news_items WHERE ingested_at < ?", (now - NEWS_RETENTION,))
+    due = conn.execute(
+        "SELECT company_key, company FROM news_tracked WHERE last_polled < ?", (now - NEWS_POLL_INTERVAL,)
+    ).fetchall()
+    claimed = []
+    for key, company in due:
+        cursor = conn.execute(
+            "UPDATE news_tracked SET last_polled = ? WHERE company_key = ? AND last_polled < ?",
+            (now - NEWS_POLL_INTERVAL + 60, key, now - NEWS_POLL_INTERVAL),
+        )
+        if cursor.rowcount:
+            claimed.append(company)
+    conn.commit()
+    return claimed
+
+
+async def _poll_loop():
+    limit = asyncio.Semaphore(NEWS_POLL_CONCURRENCY)
+
+    async def poll(company):
+        async with limit:
+            try:
+                added = await asyncio.to_thread(ingest_company_news, company)
+                if added:
+                    print(f"✓ News ingested for {company}: {added} new stories")
+            except Exception as e:
+                print(f"✗ News poll failed for {company}: {e}")
+
+    while True:
+        try:
+            companies = await asyncio.to_thread(_claim_due_companies)
+            await asyncio.gather(*(poll(company) for company in companies))
+        except Exception as e:
+            print(f"✗ News poller error: {e}")
+        await asyncio.sleep(min(60, NEWS_POLL_INTERVAL))
+
+
+def start_news_poller():
+    global _poller_task
+    if NEWS_POLLER_ENABLED and _poller_task is None:
+        _poller_task = asyncio.get_running_loop().create_task(_poll_loop())
+        print(f"✓ News poller started (interval {NEWS_POLL_INTERVAL}s)")
+
+
+async def stop_news_poller():
+    global _poller_task
+    if _poller_task is not None:
+        _poller_task.cancel()
+        try:
+            await _poller_task
+        except asyncio.CancelledError:
+            pass
+        _poller_task = None
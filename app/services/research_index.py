@@ -0,0 +1,262 @@
+"""
+Per-company retrieval index over research data, used by chat.
+
+The research object is split into labelled chunks (scalar groups, list
+items, overlapping windows of long text) and indexed with Okapi BM25 the
+first time it's used. Each chat question then carries only the top-k
+chunks for that question plus the structured numeric table, instead of
+the first N characters of the whole blob.
+
+If CHAT_EMBEDDING_MODEL is set and sentence-transformers is installed,
+chunk embeddings are computed on the CPU as well and scores are a blend
+of BM25 and cosine similarity.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from app.services.context_builder import PLAN_PRIORITIES, build_context, compact_json, count_tokens, truncate_to_tokens
+from app.services.singleflight import content_hash
+
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "8"))
+CHAT_INDEX_ENTRIES = int(os.getenv("CHAT_INDEX_ENTRIES", "64"))
+CHAT_EMBEDDING_MODEL = os.getenv("CHAT_EMBEDDING_MODEL", "")
+# Weight of embedding similarity vs. BM25 when embeddings are enabled
+CHAT_EMBEDDING_WEIGHT = float(os.getenv("CHAT_EMBEDDING_WEIGHT", "0.5"))
+
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 20
+# Below this share of the budget the excerpts are topped up with the priority-packed research
+MIN_EXCERPT_SHARE = 0.5
+# Strings up to this long are grouped with their siblings instead of chunked alone
+SHORT_VALUE_CHARS = 200
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Bookkeeping fields that never help answer a question; numeric_table is sent separately
+SKIP_KEYS = {"status", "partial", "budget_ms", "timings_ms", "timed_out", "logo_url", "numeric_table", "research_id"}
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "does", "for", "from", "has", "have", "how", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "their", "this", "to", "was", "what", "when",
+    "where", "which", "who", "why", "with", "do", "did", "they", "about", "tell", "me",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+# Words whose trailing "s" isn't a plural ("news" is not "new")
+_INVARIANT = {"news", "series", "species"}
+
+
+def _stem(token: str) -> str:
+    """
+    Strip common English inflections so every form of a word shares one stem.
+
+    >>> [_stem(word) for word in ("acquire", "acquired", "acquires", "acquiring")]
+    ['acquir', 'acquir', 'acquir', 'acquir']
+    >>> _stem("business") == _stem("businesses"), _stem("company") == _stem("companies")
+    (True, True)
+    >>> _stem("news") != _stem("new"), _stem("plan") == _stem("planned") == _stem("planning")
+    (True, True)
+    """
+    if token in _INVARIANT or len(token) <= 3:
+        return token
+    # Plurals / third person: businesses -> business, companies -> company, taxes -> tax
+    if token.endswith("sses"):
+        token = token[:-2]
+    elif token.endswith("ies") and len(token) > 4:
+        token = token[:-3] + "y"
+    elif token.endswith(("xes", "zes", "ches", "shes")):
+        token = token[:-2]
+    elif token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        token = token[:-1]
+    # Past tense / participle: applied -> apply, planned -> plan, earning -> earn
+    for suffix in ("ing", "ed"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[: -len(suffix)]
+            if token.endswith("i"):
+                token = token[:-1] + "y"
+            elif token[-1] == token[-2] and token[-1] not in "lsz":
+                token = token[:-1]
+            break
+    # 'acquire' -> 'acquir', the same stem the suffixed forms reduce to
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]
+    return token
+
+
+def _tokenize(text: str):
+    return [_stem(token) for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _windows(text: str):
+    words = text.split()
+    if len(words) <= CHUNK_WORDS:
+        yield text
+        return
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    for start in range(0, len(words) - CHUNK_OVERLAP, step):
+        yield " ".join(words[start:start + CHUNK_WORDS])
+
+
+def _is_short(value):
+    return not isinstance(value, (dict, list)) and len(str(value)) <= SHORT_VALUE_CHARS
+
+
+def chunk_research(value, label: str = "research"):
+    """(label, text) chunks for every piece of the research object"""
+    if isinstance(value, dict):
+        # Short scalar siblings (e.g. Yahoo metrics) stay together in one chunk
+        short = [(key, item) for key, item in value.items() if key not in SKIP_KEYS and item not in (None, "") and _is_short(item)]
+        if short:
+            yield label, "; ".join(f"{key}: {item}" for key, item in short)
+        for key, item in value.items():
+            if key in SKIP_KEYS or item in (None, "", [], {}) or _is_short(item):
+                continue
+            # A failed analysis echoes the raw data it was given
+            if key == "raw_data" and label.endswith("> analysis"):
+                continue
+            yield from chunk_research(item, f"{label} > {key}")
+    elif isinstance(value, list):
+        if all(_is_short(item) for item in value):
+            yield label, "; ".join(str(item) for item in value)
+            return
+        for position, item in enumerate(value, 1):
+            yield from chunk_research(item, f"{label} [{position}]")
+    else:
+        for window in _windows(str(value)):
+            yield label, window
+
+
+def _get_embedder():
+    global _embedder
+    if not CHAT_EMBEDDING_MODEL:
+        return None
+    with _embedder_lock:
+        if _embedder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                _embedder = SentenceTransformer(CHAT_EMBEDDING_MODEL, device="cpu")
+                print(f"✓ Chat embeddings enabled with model: {CHAT_EMBEDDING_MODEL}")
+            except Exception as e:
+                print(f"✗ Chat embeddings unavailable, using BM25 only: {e}")
+                _embedder = False
+    return _embedder or None
+
+
+class ResearchIndex:
+    """BM25 (plus optional embeddings) over one research object's chunks"""
+
+    def __init__(self, research):
+        self.chunks = list(chunk_research(research))
+        docs = [_tokenize(f"{label} {text}") for label, text in self.chunks]
+        self.doc_lengths = np.array([len(doc) for doc in docs], dtype=float)
+        self.avg_length = self.doc_lengths.mean() if len(docs) else 0.0
+
+        # term -> (doc ids, term frequencies) for vectorized scoring
+        postings = {}
+        for doc_id, doc in enumerate(docs):
+            for term, tf in Counter(doc).items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+        self.postings = {term: (np.array(ids), np.array(tfs, dtype=float)) for term, (ids, tfs) in postings.items()}
+
+        self.embeddings = None
+        embedder = _get_embedder()
+        if embedder is not None and self.chunks:
+            self.embeddings = embedder.encode(
+                [f"{label}: {text}" for label, text in self.chunks], normalize_embeddings=True
+            )
+
+    def _bm25(self, query: str):
+        scores = np.zeros(len(self.chunks))
+        n = len(self.chunks)
+        for term in set(_tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, tfs = self.postings[term]
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[ids] / self.avg_length)
+            scores[ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+    def search(self, query: str, k: int = CHAT_TOP_K):
+        """Top-k (label, text, score) chunks for `query`, best first"""
+        if not self.chunks:
+            return []
+        scores = self._bm25(query)
+        if self.embeddings is not None:
+            similarity = self.embeddings @ _get_embedder().encode([query], normalize_embeddings=True)[0]
+            peak = scores.max()
+            scores = (1 - CHAT_EMBEDDING_WEIGHT) * (scores / peak if peak > 0 else scores) + CHAT_EMBEDDING_WEIGHT * similarity
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(*self.chunks[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_research_index(research, key: str = None) -> ResearchIndex:
+    """Index for `research`, built on first use and kept in a small LRU"""
+    key = key or content_hash(research)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = ResearchIndex(research)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > CHAT_INDEX_ENTRIES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def numeric_table(research):
+    """The analysis numeric table, or the Yahoo metrics when there's no analysis"""
+    if not isinstance(research, dict):
+        return None
+    analysis = research.get("analysis")
+    if isinstance(analysis, dict) and analysis.get("numeric_table"):
+        return analysis["numeric_table"]
+    raw = research.get("raw_data", research)
+    yahoo = raw.get("yahoo_finance") if isinstance(raw, dict) else None
+    if isinstance(yahoo, dict) and "error" not in yahoo:
+        return {key: value for key, value in yahoo.items() if value is not None and _is_short(value)}
+    return None
+
+
+def build_chat_context(research, question: str, max_tokens: int, key: str = None) -> str:
+    """
+    Numeric table plus the chunks most relevant to `question`, within `max_tokens`.
+    When few chunks match (broad questions, or no shared terms), the rest of the
+    budget carries the research packed by priority, as before retrieval.
+    """
+    parts = []
+    numbers = numeric_table(research)
+    if numbers:
+        parts.append("Key numbers (JSON):\n" + truncate_to_tokens(compact_json(numbers), max_tokens // 3))
+    remaining = max_tokens - sum(count_tokens(part) for part in parts)
+    excerpt_budget = remaining
+
+    excerpts = []
+    for label, text, _ in get_research_index(research, key).search(question):
+        excerpt = f"[{label}] {text}"
+        cost = count_tokens(excerpt)
+        if cost > remaining:
+            continue
+        excerpts.append(excerpt)
+        remaining -= cost
+    if excerpts:
+        parts.append("Relevant excerpts:\n" + "\n".join(excerpts))
+    if excerpt_budget - remaining < excerpt_budget * MIN_EXCERPT_SHARE and remaining > 0:
+        parts.append("Research data (JSON):\n" + build_context(research, remaining, PLAN_PRIORITIES))
+    return "\n\n".join(parts)
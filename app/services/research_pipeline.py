@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import inspect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.research_tools import (
+    fetch_wikipedia_detailed,
+    fetch_yahoo_finance_data,
+    ddg_instant_answers,
+    scrape_company_website,
+    fetch_news_rss
+)
+from app.services.site_crawler import crawl_company_website
+from app.services.fundamentals import get_derived_fundamentals
+from app.services.wikipedia_doc import begin_request_scope, end_request_scope
+
+# Multi-page async crawl for the website source instead of the single-page scrape
+WEBSITE_CRAWL_ENABLED = os.getenv("WEBSITE_CRAWL_ENABLED", "true").lower() == "true"
+
+# Default time budget for one research run (all sources share it)
+DEFAULT_BUDGET_MS = int(os.getenv("RESEARCH_BUDGET_MS", "8000"))
+MAX_BUDGET_MS = int(os.getenv("RESEARCH_MAX_BUDGET_MS", "60000"))
+
+# Source name -> fetcher. Keys match the raw_data keys returned to the client.
+RESEARCH_SOURCES = {
+    "wikipedia": fetch_wikipedia_detailed,
+    "yahoo_finance": fetch_yahoo_finance_data,
+    "ddg": ddg_instant_answers,
+    "website": crawl_company_website if WEBSITE_CRAWL_ENABLED else scrape_company_website,
+    "news": fetch_news_rss,
+    "fundamentals": get_derived_fundamentals,
+}
+
+# Dedicated worker threads for the blocking fetchers, so research traffic
+# can't exhaust the event loop's default executor
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "32"))
+_executor = ThreadPoolExecutor(max_workers=RESEARCH_WORKERS, thread_name_prefix="research")
+
+# Max concurrent in-flight calls per source across all requests and batch jobs,
+# e.g. SOURCE_CONCURRENCY_WIKIPEDIA=4. Keeps us polite to each upstream provider.
+DEFAULT_SOURCE_CONCURRENCY = int(os.getenv("SOURCE_CONCURRENCY", "8"))
+SOURCE_CONCURRENCY = {
+    name: int(os.getenv(f"SOURCE_CONCURRENCY_{name.upper()}", DEFAULT_SOURCE_CONCURRENCY))
+    for name in RESEARCH_SOURCES
+}
+_source_limits = {name: asyncio.Semaphore(limit) for name, limit in SOURCE_CONCURRENCY.items()}
+
+
+def resolve_budget_ms(budget_ms=None):
+    """Clamp a caller supplied budget to a sane range"""
+    if not budget_ms or budget_ms <= 0:
+        return DEFAULT_BUDGET_MS
+    return min(int(budget_ms), MAX_BUDGET_MS)
+
+
+def timed_out_entry(source: str, budget_ms: int):
+    """Placeholder returned for a source that missed the deadline"""
+    return {
+        "status": "timeout",
+        "partial": True,
+        "error": f"{source} did not finish within {budget_ms} ms"
+    }
+
+
+async def run_source(name: str, company: str):
+    """
+    Run one source under its concurrency limit. Blocking sources go to the
+    research executor and hold their slot until the worker thread actually
+    finishes, even if the caller gives up on it at the deadline.
+    """
+    limit = _source_limits[name]
+    fetcher = RESEARCH_SOURCES[name]
+    if inspect.iscoroutinefunction(fetcher):
+        # Async sources run on the event loop and are cancelled at the deadline
+        async with limit:
+            return await fetcher(company)
+
+    await limit.acquire()
+    loop = asyncio.get_running_loop()
+    try:
+        ctx = contextvars.copy_context()
+        future = _executor.submit(ctx.run, fetcher, company)
+    except Exception:
+        limit.release()
+        raise
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(limit.release))
+    return await asyncio.wrap_future(future)
+
+
+async def iter_research_sources(company: str, budget_ms=None):
+    """
+    Run every research source concurrently and yield (source, result, elapsed_ms)
+    in completion order. Sources still running (or still waiting for a
+    concurrency slot) when the budget expires are yielded as timed-out entries;
+    running worker threads are left to finish in the background since blocking
+    calls cannot be interrupted.
+    """
+    budget_ms = resolve_budget_ms(budget_ms)
+    started = time.perf_counter()
+    deadline = started + budget_ms / 1000
+
+    # Tasks copy the context on creation, so they all share this request's
+    # Wikipedia memo; reset right away so it doesn't leak into the caller
+    scope = begin_request_scope()
+    try:
+        tasks = {
+            asyncio.create_task(run_source(name, company)): name
+            for name in RESEARCH_SOURCES
+        }
+    finally:
+        end_request_scope(scope)
+    pending = set(tasks)
+
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            name = tasks[task]
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+            try:
+                result = task.result()
+            except Exception as e:
+                result = {"error": f"{name} failed: {str(e)}"}
+            yield name, result, elapsed_ms
+
+    for task in pending:
+        task.cancel()
+        name = tasks[task]
+        print(f"✗ Research source '{name}' timed out after {budget_ms} ms")
+        yield name, timed_out_entry(name, budget_ms), budget_ms
+
+
+async def gather_research(company: str, budget_ms=None):
+    """
+    Collect all research sources under one deadline.
+    Returns (raw, timings) where raw keeps the source order of RESEARCH_SOURCES.
+    """
+    results = {}
+    timings = {}
+    async for name, result, elapsed_ms in iter_research_sources(company, budget_ms):
+        results[name] = result
+        timings[name] = elapsed_ms
+
+    raw = {name: results.get(name) for name in RESEARCH_SOURCES}
+    return raw, timings
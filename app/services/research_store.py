@@ -0,0 +1,188 @@
+"""
+Server-side handles for /research/company results.
+
+Each research result is kept under a random research_id. Plan and chat
+requests can send that id instead of posting the whole research object (raw
+Wikipedia text, news, analysis) back on every turn.
+
+Two tiers: a parsed in-memory LRU of at most RESEARCH_STORE_ENTRIES results
+in each worker, in front of the serialized result in the shared SQLite
+store, so an id handed out by one uvicorn worker resolves on any other.
+Entries expire after RESEARCH_STORE_TTL seconds without use in either tier.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.services.source_cache import CACHE_DB_PATH, get_connection
+
+RESEARCH_STORE_ENTRIES = int(os.getenv("RESEARCH_STORE_ENTRIES", "256"))
+# Idle seconds before a stored result expires (each plan/chat use extends it)
+RESEARCH_STORE_TTL = int(os.getenv("RESEARCH_STORE_TTL", str(2 * 3600)))
+
+# In-memory hits refresh the shared row's last_used at most this often (seconds)
+TOUCH_INTERVAL = 60
+
+# research_id -> (company, research, last_used, last touched in the shared store)
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {"stored": 0, "hits": 0, "shared_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(CACHE_DB_PATH)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS research_handles (
+                research_id TEXT PRIMARY KEY,
+                company TEXT,
+                research TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_research_handles_last_used ON research_handles (last_used)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _write_shared(research_id: str, company: str, research: dict, now: float):
+    conn = _db()
+    conn.execute("DELETE FROM research_handles WHERE last_used < ?", (now - RESEARCH_STORE_TTL,))
+    conn.execute(
+        "INSERT OR REPLACE INTO research_handles (research_id, company, research, last_used) VALUES (?, ?, ?, ?)",
+        (research_id, company, json.dumps(research, default=str), now),
+    )
+    conn.commit()
+
+
+def _read_shared(research_id: str, now: float):
+    """(company, research) from the shared store, extending its TTL; None if unknown or expired"""
+    conn = _db()
+    row = conn.execute(
+        "SELECT company, research, last_used FROM research_handles WHERE research_id = ?", (research_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    company, research, last_used = row
+    if now - last_used > RESEARCH_STORE_TTL:
+        conn.execute("DELETE FROM research_handles WHERE research_id = ?", (research_id,))
+        conn.commit()
+        return None
+    conn.execute("UPDATE research_handles SET last_used = ? WHERE research_id = ?", (now, research_id))
+    conn.commit()
+    return company, json.loads(research)
+
+
+def _touch_shared(research_id: str, now: float):
+    conn = _db()
+    conn.execute("UPDATE research_handles SET last_used = ? WHERE research_id = ?", (now, research_id))
+    conn.commit()
+
+
+def _prune(now: float):
+    while _entries:
+        research_id, (_, _, last_used, _) = next(iter(_entries.items()))
+        if now - last_used <= RESEARCH_STORE_TTL:
+            break
+        del _entries[research_id]
+        _stats["expired"] += 1
+
+
+def _remember(research_id: str, company: str, research: dict, now: float):
+    with _lock:
+        _prune(now)
+        _entries[research_id] = (company, research, now, now)
+        _entries.move_to_end(research_id)
+        while len(_entries) > RESEARCH_STORE_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+async def store_research(company: str, research: dict) -> str:
+    """Keep `research` for later plan/chat calls on any worker; returns its research_id"""
+    research_id = uuid.uuid4().hex
+    now = time.time()
+    _remember(research_id, company, research, now)
+    with _lock:
+        _stats["stored"] += 1
+    try:
+        await asyncio.to_thread(_write_shared, research_id, company, research, now)
+    except Exception as e:
+        print(f"✗ Could not write research {research_id} to the shared store: {e}")
+    return research_id
+
+
+async def get_research(research_id: str):
+    """(company, research) for `research_id`, or None if unknown or expired"""
+    now = time.time()
+    touch = False
+    with _lock:
+        entry = _entries.get(research_id)
+        if entry is not None:
+            company, research, last_used, touched = entry
+            if now - last_used > RESEARCH_STORE_TTL:
+                del _entries[research_id]
+                _stats["expired"] += 1
+                entry = None
+            else:
+                touch = now - touched > TOUCH_INTERVAL
+                _entries[research_id] = (company, research, now, now if touch else touched)
+                _entries.move_to_end(research_id)
+                _stats["hits"] += 1
+    if entry is not None:
+        if touch:
+            # Keep the shared row alive for other workers while this one serves the id
+            try:
+                await asyncio.to_thread(_touch_shared, research_id, now)
+            except Exception as e:
+                print(f"✗ Could not refresh research {research_id} in the shared store: {e}")
+        return company, research
+
+    try:
+        stored = await asyncio.to_thread(_read_shared, research_id, now)
+    except Exception as e:
+        print(f"✗ Could not read research {research_id} from the shared store: {e}")
+        stored = None
+    if stored is None:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    company, research = stored
+    _remember(research_id, company, research, now)
+    with _lock:
+        _stats["shared_hits"] += 1
+    return company, research
+
+
+async def resolve_research(payload: dict):
+    """
+    (company, research, research_id, error) for a plan/chat payload, which
+    carries either `research_id` or the full `research` object.
+    """
+    research_id = payload.get("research_id")
+    if research_id:
+        stored = await get_research(research_id)
+        if stored is None:
+            return None, None, None, f"Unknown or expired research_id {research_id}; run /research/company again"
+        company, research = stored
+        return payload.get("company") or company, research, research_id, None
+    return payload.get("company"), payload.get("research"), None, None
+
+
+def research_store_stats():
+    with _lock:
+        _prune(time.time())
+        return {
+            "entries": len(_entries),
+            "max_entries": RESEARCH_STORE_ENTRIES,
+            "ttl": RESEARCH_STORE_TTL,
+            **_stats,
+        }
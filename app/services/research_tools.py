@@ -1,16 +1,18 @@
-import requests
 from bs4 import BeautifulSoup
-import feedparser
-import wikipedia
 import re
-from urllib.parse import urlencode, quote_plus, urljoin
+from urllib.parse import urlencode, quote_plus, urljoin, unquote
 import yfinance as yf
-
-HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36"}
+from app.services import http_client
+from app.services.source_cache import cached_source
+from app.services.symbol_directory import resolve_ticker
+from app.services.wikipedia_doc import get_wikipedia_document
+from app.services.html_scan import PageScanner, scan_url
+from app.services.news_store import read_news, track_company, ingest_company_news
 
 # -------------------------
 # Yahoo Finance using yfinance library (RELIABLE METHOD)
 # -------------------------
+@cached_source("yahoo_finance")
 def fetch_yahoo_finance_data(company: str):
     """
     Fetch financial data using yfinance library.
@@ -23,16 +25,23 @@ def fetch_yahoo_finance_data(company: str):
             company.split()[0].upper(),  # First word
         ]
         
-        # Try to get ticker from Wikipedia first
-        try:
-            wiki_page = wikipedia.page(company, auto_suggest=True)
-            # Extract ticker from page content
-            content = wiki_page.content
-            ticker_match = re.search(r'(?:ticker|symbol)[:|\s]+([A-Z]{1,5})', content, re.IGNORECASE)
-            if ticker_match:
-                possible_tickers.insert(0, ticker_match.group(1))
-        except:
-            pass
+        # Local symbol directory first (no network); Wikipedia only if it has no match
+        directory_ticker = resolve_ticker(company)
+        if directory_ticker:
+            possible_tickers.insert(0, directory_ticker)
+        else:
+            try:
+                # Reuses the Wikipedia document fetched for this request
+                doc = get_wikipedia_document(company)
+                if doc:
+                    ticker_match = re.search(r'(?:ticker|symbol)[:|\s]+([A-Z]{1,5})', doc["extract"], re.IGNORECASE)
+                    if ticker_match:
+                        possible_tickers.insert(0, ticker_match.group(1))
+                    # Infobox "Traded as" listings are the most reliable
+                    for listing in reversed(doc.get("tickers", [])):
+                        possible_tickers.insert(0, listing["symbol"])
+            except:
+                pass
         
         # Try each possible ticker
         for ticker_symbol in possible_tickers:
@@ -89,59 +98,23 @@ def fetch_yahoo_finance_data(company: str):
         return {"error": f"Yahoo Finance yfinance failed: {str(e)}"}
 
 
+@cached_source("wikipedia")
 def fetch_wikipedia_detailed(company: str):
     try:
-        wikipedia.set_lang("en")
-        page = wikipedia.page(company, auto_suggest=True)
-        summary = wikipedia.summary(company, sentences=15)  # Increased from 6 to 15
-        content = page.content[:15000]  # Increased from 6000 to 15000
+        # One API round trip for extract, summary, infobox, logo and URL
+        doc = get_wikipedia_document(company)
+        if not doc:
+            return {"error": "No wikipedia page / extract found"}
         info = {
-            "title": page.title,
-            "summary": summary,
-            "content_snippet": content,
-            "url": page.url
+            "title": doc["title"],
+            "summary": doc["summary"],
+            "content_snippet": doc["extract"][:15000],
+            "url": doc["url"]
         }
-        # attempt to pull infobox numeric fields from page html (fallback)
-        try:
-            html = requests.get(page.url, headers=HEADERS, timeout=10).text
-            soup = BeautifulSoup(html, "lxml")
-            # find infobox rows
-            infobox = soup.find("table", {"class": re.compile("infobox")})
-            if infobox:
-                rows = {}
-                for tr in infobox.find_all("tr"):
-                    th = tr.find("th")
-                    td = tr.find("td")
-                    if th and td:
-                        key = th.text.strip()
-                        val = " ".join(td.text.split())
-                        rows[key] = val
-                info["infobox"] = rows
-                
-                # Try to get logo from infobox
-                try:
-                    logo_img = infobox.find("img")
-                    if logo_img and logo_img.get("src"):
-                        logo_url = logo_img.get("src")
-                        if logo_url.startswith("//"):
-                            logo_url = "https:" + logo_url
-                        elif logo_url.startswith("/"):
-                            logo_url = "https://en.wikipedia.org" + logo_url
-                        info["logo_url"] = logo_url
-                except Exception:
-                    pass
-                    
-        except Exception:
-            pass
-        
-        # Also try Wikipedia API for logo
-        try:
-            api_url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{company.replace(' ', '_')}"
-            api_response = requests.get(api_url, headers=HEADERS, timeout=10).json()
-            if api_response.get("thumbnail") and api_response["thumbnail"].get("source"):
-                info["logo_url"] = api_response["thumbnail"]["source"]
-        except Exception:
-            pass
+        if doc.get("infobox"):
+            info["infobox"] = doc["infobox"]
+        if doc.get("thumbnail"):
+            info["logo_url"] = doc["thumbnail"]
 
         return info
     except Exception:
@@ -150,12 +123,13 @@ def fetch_wikipedia_detailed(company: str):
 # -------------------------
 # DuckDuckGo instant answers (simple)
 # -------------------------
+@cached_source("ddg")
 def ddg_instant_answers(company: str):
     try:
         # Using DuckDuckGo JSON Instant Answer API
         url = "https://api.duckduckgo.com/"
         params = {"q": f"{company} annual revenue", "format": "json", "no_html": 1, "skip_disambig": 1}
-        r = requests.get(url, params=params, headers=HEADERS, timeout=8).json()
+        r = http_client.get(url, params=params, timeout=8).json()
         return {
             "Abstract": r.get("Abstract"),
             "AbstractText": r.get("AbstractText"),
@@ -167,11 +141,12 @@ def ddg_instant_answers(company: str):
 # -------------------------
 # Find Yahoo Finance URL via DuckDuckGo HTML search
 # -------------------------
+@cached_source("yahoo_url")
 def find_yahoo_finance_url(company: str):
     try:
         query = quote_plus(f"{company} site:finance.yahoo.com")
         search_url = f"https://duckduckgo.com/html/?q={query}"
-        r = requests.get(search_url, headers=HEADERS, timeout=8)
+        r = http_client.get(search_url, timeout=8)
         soup = BeautifulSoup(r.text, "lxml")
         a = soup.select_one("a.result__a")
         if a:
@@ -182,7 +157,7 @@ def find_yahoo_finance_url(company: str):
                 # extract uddg param
                 m = re.search(r"uddg=(https%3A%2F%2F[^&]+)", link)
                 if m:
-                    return requests.utils.unquote(m.group(1))
+                    return unquote(m.group(1))
             # sometimes direct
             return link
         return None
@@ -192,9 +167,10 @@ def find_yahoo_finance_url(company: str):
 # -------------------------
 # Scrape Yahoo Finance numeric values
 # -------------------------
+@cached_source("yahoo_scrape")
 def scrape_yahoo_financials(yahoo_url: str):
     try:
-        r = requests.get(yahoo_url, headers=HEADERS, timeout=10)
+        r = http_client.get(yahoo_url, timeout=10)
         html = r.text
         soup = BeautifulSoup(html, "lxml")
 
@@ -255,7 +231,7 @@ def scrape_yahoo_financials(yahoo_url: str):
                     bs_link = urljoin("https://finance.yahoo.com", href)
                     break
             if bs_link:
-                r2 = requests.get(bs_link, headers=HEADERS, timeout=8).text
+                r2 = http_client.get(bs_link, timeout=8).text
                 s2 = BeautifulSoup(r2, "lxml")
                 # find first few numeric rows
                 for tr in s2.select("div#Main table tr")[:10]:
@@ -280,50 +256,56 @@ def scrape_yahoo_financials(yahoo_url: str):
 # -------------------------
 # Company website scraping (basic)
 # -------------------------
-def scrape_company_website(company: str):
+@cached_source("website_url")
+def find_company_site(company: str):
+    """Official site URL via DuckDuckGo (stops at the first result link)"""
     try:
-        # find official site via DuckDuckGo
         query = quote_plus(f"{company} official website")
         search_url = f"https://duckduckgo.com/html/?q={query}"
-        r = requests.get(search_url, headers=HEADERS, timeout=8)
-        soup = BeautifulSoup(r.text, "lxml")
-        a = soup.select_one("a.result__a")
-        if not a:
+        search = PageScanner(result_class="result__a")
+        scan_url(search_url, search)
+        link = search.result_href
+        if not link:
             return None
-        link = a.get("href")
         if link.startswith("/l/?"):
             m = re.search(r"uddg=(https%3A%2F%2F[^&]+)", link)
             if m:
-                site = requests.utils.unquote(m.group(1))
-            else:
-                site = link
-        else:
-            site = link
+                return unquote(m.group(1))
+        return link
+    except Exception:
+        return None
+
+@cached_source("website")
+def scrape_company_website(company: str):
+    try:
+        # find official site via DuckDuckGo
+        site = find_company_site(company)
+        if not site:
+            return None
 
-        # fetch site and simple data
+        # fetch site and simple data; streamed with a byte cap. Script srcs are
+        # collected to the end of the page (frameworks often load theirs at the
+        # end of <body>), so only pages past the cap are cut short
         try:
-            r2 = requests.get(site, headers=HEADERS, timeout=8)
-            s2 = BeautifulSoup(r2.text, "lxml")
-            title = s2.title.string if s2.title else None
-            description_tag = s2.find("meta", attrs={"name": "description"})
-            desc = description_tag["content"] if description_tag else None
+            home = PageScanner(want_head=True, want_about=True, want_scripts=True)
+            scan_url(site, home)
+            title = home.title
+            desc = home.description
             # tech detection
             tech = []
-            for script in s2.find_all("script"):
-                src = script.get("src", "")
+            for src in home.scripts:
                 if "react" in src.lower():
                     tech.append("React")
                 if "next" in src.lower():
                     tech.append("Next.js")
             # basic about page snippet
             about = None
-            about_tag = s2.find(lambda t: t.name in ["a", "link"] and "about" in (t.get("href","") + t.get("text","")).lower())
-            if about_tag and about_tag.get("href"):
-                about_url = urljoin(site, about_tag["href"])
+            if home.about_href:
+                about_url = urljoin(site, home.about_href)
                 try:
-                    r3 = requests.get(about_url, headers=HEADERS, timeout=6)
-                    s3 = BeautifulSoup(r3.text, "lxml")
-                    about = " ".join([p.text for p in s3.find_all("p")[:6]])
+                    about_page = PageScanner(paragraphs=6)
+                    scan_url(about_url, about_page, timeout=6)
+                    about = " ".join(about_page.paragraphs)
                 except:
                     about = None
 
@@ -344,11 +326,14 @@ def scrape_company_website(company: str):
 # -------------------------
 def fetch_news_rss(company: str, limit: int = 10):
     try:
-        url = f"https://news.google.com/rss/search?q={quote_plus(company)}"
-        feed = feedparser.parse(url)
-        items = []
-        for e in feed.entries[:limit]:
-            items.append({"title": getattr(e, "title", None), "link": getattr(e, "link", None), "published": getattr(e, "published", None)})
+        # Served from the background-ingested store (deduplicated stories);
+        # the first request for a company ingests its feed inline and
+        # registers it with the poller
+        items = read_news(company, limit)
+        if items is None:
+            track_company(company)
+            ingest_company_news(company)
+            items = read_news(company, limit) or []
         return items
     except Exception:
         return []
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+from app.services import http_client
+from app.services.source_cache import CACHE_DB_PATH, get_connection
+
+# Stored validators older than this are dropped
+REVALIDATION_MAX_AGE = int(os.getenv("REVALIDATION_MAX_AGE", str(30 * 86400)))
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "not_modified": 0, "modified": 0, "no_validators": 0}
+_writes = 0
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(CACHE_DB_PATH)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS http_validators (
+                request_key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                parsed TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def revalidation_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _request_key(url: str, params=None) -> str:
+    if not params:
+        return url
+    return url + "?" + urlencode(sorted(params.items()))
+
+
+def conditional_get(url: str, parse, params=None, timeout=None):
+    """
+    GET `url` with If-None-Match / If-Modified-Since from the previous
+    response. On 304 the stored parsed result is returned without touching
+    the body; otherwise `parse(response)` runs and is stored with the new
+    validators (only when the server sent any).
+    """
+    global _writes
+    key = _request_key(url, params)
+    stored = None
+    try:
+        stored = _db().execute(
+            "SELECT etag, last_modified, parsed FROM http_validators WHERE request_key = ?", (key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"✗ Validator read failed: {e}")
+
+    headers = {}
+    if stored:
+        if stored[0]:
+            headers["If-None-Match"] = stored[0]
+        if stored[1]:
+            headers["If-Modified-Since"] = stored[1]
+
+    _count("requests")
+    response = http_client.get(url, params=params, headers=headers or None, timeout=timeout)
+    if response.status_code == 304 and stored:
+        _count("not_modified")
+        try:
+            conn = _db()
+            conn.execute("UPDATE http_validators SET fetched_at = ? WHERE request_key = ?", (time.time(), key))
+            conn.commit()
+        except sqlite3.Error:
+            pass
+        return json.loads(stored[2])
+
+    parsed = parse(response)
+    if response.status_code != 200:
+        return parsed
+    etag = response.headers.get("etag")
+    last_modified = response.headers.get("last-modified")
+    if not (etag or last_modified):
+        _count("no_validators")
+        return parsed
+
+    _count("modified")
+    try:
+        now = time.time()
+        conn = _db()
+        conn.execute(
+            "INSERT OR REPLACE INTO http_validators (request_key, etag, last_modified, parsed, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (key, etag, last_modified, json.dumps(parsed, default=str), now),
+        )
+        _writes += 1
+        if _writes % 200 == 0:
+            conn.execute("DELETE FROM http_validators WHERE fetched_at < ?", (now - REVALIDATION_MAX_AGE,))
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"✗ Validator write failed: {e}")
+    return parsed
@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import json
+
+# All groups by name, for /metrics/singleflight
+_groups = {}
+
+
+def normalize_key(*parts) -> str:
+    """Key from call options; strings are case/whitespace-normalized"""
+    return json.dumps([" ".join(p.lower().split()) if isinstance(p, str) else p for p in parts], default=str)
+
+
+def content_hash(value) -> str:
+    """Stable hash of a JSON-serializable payload"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: the first caller for a key starts the
+    work, later callers with the same key await the same task. The key is
+    released as soon as the task finishes, so this is not a cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+        self.executions = 0
+        self.shared = 0
+        _groups[name] = self
+
+    async def do(self, key: str, fn, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+            self.executions += 1
+        else:
+            self.shared += 1
+        # Shielded so one caller disconnecting doesn't cancel the others' result
+        return await asyncio.shield(task)
+
+    def _release(self, key: str, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "executions": self.executions, "shared": self.shared}
+
+
+def singleflight_stats():
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urljoin, urlparse, urldefrag
+from urllib.robotparser import RobotFileParser
+
+from app.services import http_client
+from app.services.html_scan import PageScanner, aread_capped
+from app.services.research_tools import find_company_site
+from app.services.source_cache import cache, cached_source, make_key
+
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "6"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+CRAWL_HOST_CONCURRENCY = int(os.getenv("CRAWL_HOST_CONCURRENCY", "3"))
+CRAWL_PAGE_MAX_BYTES = int(os.getenv("CRAWL_PAGE_MAX_BYTES", str(256 * 1024)))
+CRAWL_PAGE_TIMEOUT = float(os.getenv("CRAWL_PAGE_TIMEOUT", "6"))
+ROBOTS_TTL = int(os.getenv("ROBOTS_TTL", "3600"))
+# Hosts remembered for robots.txt and per-host limits (least recently used dropped first)
+CRAWL_HOST_ENTRIES = int(os.getenv("CRAWL_HOST_ENTRIES", "1024"))
+# Idle seconds before a host's concurrency limiter is dropped
+HOST_LIMIT_TTL = 600
+
+# Page categories worth sending to the LLM, in priority order, with the
+# URL/anchor keywords that identify them
+PAGE_CATEGORIES = [
+    ("about", ("about", "who-we-are", "our-company", "company")),
+    ("products", ("product", "solution", "platform", "services")),
+    ("investors", ("investor", "shareholder", "annual-report")),
+    ("careers", ("career", "jobs", "join-us")),
+    ("press", ("press", "newsroom", "news", "media")),
+]
+_CATEGORY_RANK = {category: rank for rank, (category, _) in enumerate(PAGE_CATEGORIES)}
+_SKIP_EXTENSIONS = re.compile(r"\.(pdf|jpe?g|png|gif|svg|webp|zip|mp4|mp3|docx?|xlsx?|pptx?)$", re.IGNORECASE)
+PAGE_TEXT_CHARS = 2000
+
+# origin -> (parser, fetched_at) and host -> (semaphore, last_used), in LRU order
+_robots = OrderedDict()
+_host_limits = OrderedDict()
+
+
+def _remember(store: OrderedDict, key, value, ttl: float):
+    """Insert/refresh `key`, then drop expired entries from the old end and anything over CRAWL_HOST_ENTRIES"""
+    store[key] = value
+    store.move_to_end(key)
+    now = time.time()
+    while store and now - next(iter(store.values()))[1] > ttl:
+        store.popitem(last=False)
+    while len(store) > CRAWL_HOST_ENTRIES:
+        store.popitem(last=False)
+
+
+def _host_limit(host: str) -> asyncio.Semaphore:
+    entry = _host_limits.get(host)
+    limit = entry[0] if entry else asyncio.Semaphore(CRAWL_HOST_CONCURRENCY)
+    _remember(_host_limits, host, (limit, time.time()), HOST_LIMIT_TTL)
+    return limit
+
+
+def _same_site(url: str, site_host: str) -> bool:
+    host = urlparse(url).netloc.lower()
+    return host.removeprefix("www.") == site_host.removeprefix("www.")
+
+
+async def _allowed(url: str) -> bool:
+    """robots.txt check, with the parsed file cached per host for ROBOTS_TTL"""
+    parsed = urlparse(url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    cached = _robots.get(origin)
+    if cached is None or time.time() - cached[1] > ROBOTS_TTL:
+        parser = RobotFileParser()
+        try:
+            response = await http_client.aget(origin + "/robots.txt", timeout=4)
+            if response.status_code >= 400:
+                parser.parse([])
+            else:
+                parser.parse(response.text.splitlines())
+        except Exception:
+            # Unreachable robots.txt: treat as allow-all
+            parser.parse([])
+        cached = (parser, time.time())
+    _remember(_robots, origin, cached, ROBOTS_TTL)
+    return cached[0].can_fetch(http_client.HEADERS["User-Agent"], url)
+
+
+def _categorize(url: str, text: str):
+    haystack = (urlparse(url).path + " " + (text or "")).lower()
+    for category, keywords in PAGE_CATEGORIES:
+        if any(keyword in haystack for keyword in keywords):
+            return category
+    return None
+
+
+def _candidate_links(base_url: str, links, site_host: str, seen: set):
+    """(url, category) for same-site, high-value links not yet seen"""
+    candidates = []
+    for href, text in links:
+        if href.startswith(("mailto:", "tel:", "javascript:", "#")):
+            continue
+        url = urldefrag(urljoin(base_url, href))[0].rstrip("/")
+        if not url.startswith(("http://", "https://")) or url in seen:
+            continue
+        if not _same_site(url, site_host) or _SKIP_EXTENSIONS.search(urlparse(url).path):
+            continue
+        category = _categorize(url, text)
+        if category:
+            candidates.append((url, category))
+    return candidates
+
+
+async def _fetch_page(url: str, site_host: str, want_head: bool = False):
+    """
+    Fetch one page politely (robots.txt, per-host limit, byte cap).
+    If its content hash matches the previous crawl the stored extraction is
+    reused and parsing is skipped.
+    """
+    if not await _allowed(url):
+        return {"url": url, "skipped": "robots.txt"}
+
+    async with _host_limit(site_host):
+        body, final_url, content_type, encoding = await aread_capped(url, CRAWL_PAGE_MAX_BYTES, timeout=CRAWL_PAGE_TIMEOUT)
+    if "html" not in content_type.lower():
+        return {"url": url, "skipped": f"content-type {content_type or 'unknown'}"}
+
+    content_hash = hashlib.sha256(body).hexdigest()
+    key = make_key("crawl_page", [url], {})
+    # SQLite lookups/stores stay off the event loop
+    previous, _ = await asyncio.to_thread(cache.lookup, "crawl_page", key)
+    if previous and previous.get("content_hash") == content_hash:
+        return {**previous, "unchanged": True}
+
+    scanner = PageScanner(want_head=want_head, paragraphs=8, links=200)
+    scanner.feed(body.decode(encoding, errors="replace"))
+    page = {
+        "url": final_url,
+        "title": scanner.title,
+        "description": scanner.description,
+        "text": " ".join(scanner.paragraphs)[:PAGE_TEXT_CHARS],
+        "links": scanner.links,
+        "scripts": scanner.scripts,
+        "content_hash": content_hash,
+    }
+    await asyncio.to_thread(cache.store, "crawl_page", key, page)
+    return {**page, "unchanged": False}
+
+
+def _detect_tech(scripts):
+    tech = []
+    for src in scripts:
+        if "react" in src.lower():
+            tech.append("React")
+        if "next" in src.lower():
+            tech.append("Next.js")
+    return list(set(tech))
+
+
+@cached_source("website_crawl")
+async def crawl_company_website(company: str):
+    """
+    Homepage plus a bounded set of high-value pages (about, products,
+    investors, careers, press), fetched concurrently level by level.
+    Returns the same fields as scrape_company_website plus `pages`.
+    """
+    try:
+        site = await asyncio.to_thread(find_company_site, company)
+        if not site:
+            return None
+        site_host = urlparse(site).netloc.lower()
+
+        try:
+            home = await _fetch_page(site, site_host, want_head=True)
+        except Exception:
+            return {"site": site}
+        if home.get("skipped"):
+            return {"site": site, "pages": []}
+
+        seen = {site.rstrip("/"), home["url"].rstrip("/")}
+        covered = set()
+        pages = []
+        frontier = [home]
+        for depth in range(1, CRAWL_MAX_DEPTH + 1):
+            budget = CRAWL_MAX_PAGES - 1 - len(pages)
+            if budget <= 0:
+                break
+            # One page per category not yet covered, in priority order
+            candidates = []
+            for parent in frontier:
+                candidates += _candidate_links(parent["url"], parent.get("links", []), site_host, seen)
+            candidates.sort(key=lambda c: _CATEGORY_RANK[c[1]])
+            picks = []
+            for url, category in candidates:
+                if category not in covered and len(picks) < budget:
+                    covered.add(category)
+                    seen.add(url)
+                    picks.append((url, category))
+            if not picks:
+                break
+
+            results = await asyncio.gather(*(_fetch_page(url, site_host) for url, _ in picks), return_exceptions=True)
+            frontier = []
+            for (url, category), result in zip(picks, results):
+                if isinstance(result, Exception):
+                    pages.append({"url": url, "category": category, "depth": depth, "error": str(result)})
+                    continue
+                pages.append({**result, "category": category, "depth": depth})
+                if not result.get("skipped"):
+                    frontier.append(result)
+
+        about = next((p.get("text") for p in pages if p.get("category") == "about" and p.get("text")), None)
+        return {
+            "site": site,
+            "title": home.get("title"),
+            "description": home.get("description"),
+            "about_snippet": about,
+            "tech": _detect_tech(home.get("scripts", [])),
+            "pages": [
+                {k: v for k, v in page.items() if k not in ("links", "scripts")}
+                for page in pages
+            ],
+        }
+    except Exception:
+        return None
@@ -0,0 +1,318 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", ".cache/nexus_cache.sqlite3")
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", "512"))
+# Threads refreshing stale entries of sync fetchers in the background
+CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", "4"))
+# Background refreshes in flight or queued; stale hits beyond this skip scheduling one
+CACHE_REFRESH_MAX_PENDING = int(os.getenv("CACHE_REFRESH_MAX_PENDING", "64"))
+
+# Default freshness per source in seconds. Override with CACHE_TTL_<SOURCE>,
+# e.g. CACHE_TTL_DDG=3600. After the TTL an entry is still served for
+# CACHE_STALE_<SOURCE> seconds (default: same as the TTL) while it is
+# refreshed in the background (stale-while-revalidate).
+DEFAULT_TTLS = {
+    "wikipedia": 3 * 86400,
+    "wikipedia_doc": 3 * 86400,
+    "yahoo_finance": 86400,
+    "yahoo_url": 7 * 86400,
+    "yahoo_scrape": 86400,
+    "ddg": 86400,
+    "website_url": 7 * 86400,
+    "website": 86400,
+    "website_crawl": 86400,
+    "crawl_page": 30 * 86400,
+    "historical": 86400,
+    "price_series": 6 * 3600,
+    "annual_financials": 7 * 86400,
+}
+DEFAULT_TTL = 3600
+
+
+def source_ttl(source: str) -> int:
+    return int(os.getenv(f"CACHE_TTL_{source.upper()}", DEFAULT_TTLS.get(source, DEFAULT_TTL)))
+
+
+def source_stale_window(source: str) -> int:
+    return int(os.getenv(f"CACHE_STALE_{source.upper()}", source_ttl(source)))
+
+
+def get_connection(path: str = None) -> sqlite3.Connection:
+    """Open a connection to the shared on-disk store (WAL mode, safe across uvicorn workers)"""
+    path = path or CACHE_DB_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class SourceCache:
+    """Bounded in-process LRU in front of a SQLite store shared by all workers"""
+
+    def __init__(self, path: str = None, max_entries: int = CACHE_MEMORY_ENTRIES):
+        self.path = path or CACHE_DB_PATH
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+        self._writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = get_connection(self.path)
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS source_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    stale_until REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_source_cache_stale ON source_cache (stale_until)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _count(self, source: str, counter: str, amount: int = 1):
+        with self._lock:
+            counters = self._stats.setdefault(source, {
+                "hits": 0, "memory_hits": 0, "disk_hits": 0, "stale_hits": 0,
+                "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "refreshes": 0,
+            })
+            counters[counter] += amount
+
+    def _remember(self, source: str, key: str, entry: tuple):
+        evicted = 0
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count(source, "evictions", evicted)
+
+    def lookup(self, source: str, key: str):
+        """Return (value, state) where state is "fresh", "stale" or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        tier = "memory_hits"
+
+        if entry is None:
+            tier = "disk_hits"
+            try:
+                row = self._db().execute(
+                    "SELECT value, expires_at, stale_until FROM source_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"✗ Cache read failed: {e}")
+                row = None
+            if row is not None:
+                entry = row
+                self._remember(source, key, entry)
+
+        if entry is None or entry[2] <= now:
+            if entry is not None:
+                self._count(source, "expired")
+            self._count(source, "misses")
+            return None, None
+
+        value_json, expires_at, _ = entry
+        state = "fresh" if expires_at > now else "stale"
+        self._count(source, "hits")
+        self._count(source, tier)
+        if state == "stale":
+            self._count(source, "stale_hits")
+        return json.loads(value_json), state
+
+    def store(self, source: str, key: str, value, ttl: int = None, stale_window: int = None):
+        ttl = source_ttl(source) if ttl is None else ttl
+        stale_window = source_stale_window(source) if stale_window is None else stale_window
+        now = time.time()
+        value_json = json.dumps(value, default=str)
+        entry = (value_json, now + ttl, now + ttl + stale_window)
+        self._remember(source, key, entry)
+        self._count(source, "stores")
+        try:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO source_cache (cache_key, source, value, stored_at, expires_at, stale_until) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source, value_json, now, entry[1], entry[2]),
+            )
+            self._writes += 1
+            # Purge dead rows every so often so the file doesn't grow forever
+            if self._writes % 200 == 0:
+                conn.execute("DELETE FROM source_cache WHERE stale_until <= ?", (now,))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"✗ Cache write failed: {e}")
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            conn = self._db()
+            conn.execute("DELETE FROM source_cache WHERE cache_key = ?", (key,))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"✗ Cache invalidate failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            sources = {name: dict(counters) for name, counters in self._stats.items()}
+            memory_entries = len(self._memory)
+        totals = {}
+        for counters in sources.values():
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+        lookups = totals.get("hits", 0) + totals.get("misses", 0)
+        return {
+            "enabled": CACHE_ENABLED,
+            "memory_entries": memory_entries,
+            "memory_capacity": self.max_entries,
+            "hit_ratio": round(totals.get("hits", 0) / lookups, 4) if lookups else None,
+            "totals": totals,
+            "sources": sources,
+            "ttls": {name: source_ttl(name) for name in DEFAULT_TTLS},
+        }
+
+
+cache = SourceCache()
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _normalize_arg(arg):
+    if isinstance(arg, str) and not arg.startswith(("http://", "https://")):
+        return " ".join(arg.lower().split())
+    return arg
+
+
+def make_key(source: str, args, kwargs) -> str:
+    """Stable key from the call arguments; company names are normalized"""
+    norm_args = [_normalize_arg(a) for a in args]
+    return json.dumps([source, norm_args, sorted(kwargs.items())], default=str)
+
+
+def is_cacheable(value) -> bool:
+    """Don't cache empty results or error payloads"""
+    if not value:
+        return False
+    if isinstance(value, dict) and "error" in value:
+        return False
+    return True
+
+
+def _store_refreshed(source: str, key: str, value):
+    if is_cacheable(value):
+        cache.store(source, key, value)
+        cache._count(source, "refreshes")
+
+
+def _refresh(source: str, key: str, fn, args, kwargs):
+    try:
+        _store_refreshed(source, key, fn(*args, **kwargs))
+    except Exception as e:
+        print(f"✗ Background refresh of {source} failed: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+async def _refresh_async(source: str, key: str, fn, args, kwargs):
+    try:
+        value = await fn(*args, **kwargs)
+        await asyncio.to_thread(_store_refreshed, source, key, value)
+    except Exception as e:
+        print(f"✗ Background refresh of {source} failed: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+_refresh_tasks = set()
+_refresh_executor = ThreadPoolExecutor(max_workers=CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+
+
+def _schedule_refresh(source: str, key: str, fn, args, kwargs):
+    with _refreshing_lock:
+        if key in _refreshing or len(_refreshing) >= CACHE_REFRESH_MAX_PENDING:
+            # Already refreshing, or too many queued: keep serving the stale value
+            return
+        _refreshing.add(key)
+    if inspect.iscoroutinefunction(fn):
+        task = asyncio.get_running_loop().create_task(_refresh_async(source, key, fn, args, kwargs))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    else:
+        _refresh_executor.submit(_refresh, source, key, fn, args, kwargs)
+
+
+def cached_source(source: str):
+    """
+    Cache a fetcher's result under `source`. Works for plain and async fetchers.
+    Fresh hits return immediately, stale hits return immediately and refresh
+    in the background, misses call through and store the result.
+    The undecorated function stays available as `fn.uncached`.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                if not CACHE_ENABLED:
+                    return await fn(*args, **kwargs)
+                key = make_key(source, args, kwargs)
+                # SQLite I/O runs on a worker thread, not the event loop
+                value, state = await asyncio.to_thread(cache.lookup, source, key)
+                if state == "fresh":
+                    return value
+                if state == "stale":
+                    _schedule_refresh(source, key, fn, args, kwargs)
+                    return value
+                value = await fn(*args, **kwargs)
+                if is_cacheable(value):
+                    await asyncio.to_thread(cache.store, source, key, value)
+                return value
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not CACHE_ENABLED:
+                    return fn(*args, **kwargs)
+                key = make_key(source, args, kwargs)
+                value, state = cache.lookup(source, key)
+                if state == "fresh":
+                    return value
+                if state == "stale":
+                    _schedule_refresh(source, key, fn, args, kwargs)
+                    return value
+                value = fn(*args, **kwargs)
+                if is_cacheable(value):
+                    cache.store(source, key, value)
+                return value
+
+        wrapper.uncached = fn
+        wrapper.cache_source = source
+        return wrapper
+    return decorator
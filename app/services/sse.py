@@ -0,0 +1,9 @@
+import json
+
+# Disable proxy buffering so events reach the browser as soon as they are sent
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,209 @@
+import csv
+import difflib
+import json
+import os
+import re
+import threading
+
+# Listing file (CSV with symbol,name,exchange,aliases or a JSON list of the same fields).
+# Point SYMBOL_DIRECTORY_PATH at a full exchange listing to cover more companies.
+DEFAULT_SYMBOLS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "symbols.csv")
+SYMBOL_DIRECTORY_PATH = os.getenv("SYMBOL_DIRECTORY_PATH", DEFAULT_SYMBOLS_PATH)
+FUZZY_CUTOFF = float(os.getenv("SYMBOL_FUZZY_CUTOFF", "0.8"))
+
+# Corporate suffixes ignored when comparing names ("Apple Inc." == "apple")
+_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited",
+    "plc", "llc", "lp", "holdings", "holding", "group", "sa", "se", "ag", "nv", "ab", "as",
+}
+_TICKER_RE = re.compile(r"^[A-Z]{1,5}([.\-][A-Z])?$")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, drop punctuation, a leading "the" and trailing corporate suffixes"""
+    name = name.lower().replace("&", " and ")
+    words = re.sub(r"[^a-z0-9]+", " ", name).split()
+    if len(words) > 1 and words[0] == "the":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in _SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+class SymbolDirectory:
+    """
+    In-memory company/ticker directory.
+    - hash indexes: normalized name/alias -> entry and symbol -> entry
+    - prefix trie over names, aliases and symbols for autocomplete
+    - difflib fuzzy matching over names and aliases for misspellings
+    """
+
+    def __init__(self, entries):
+        self.entries = []
+        self._index = {}
+        self._symbols = {}
+        self._trie = {}
+        for entry in entries:
+            self._add(entry)
+        self._keys = list(self._index)
+
+    @classmethod
+    def load(cls, path: str = None):
+        path = path or SYMBOL_DIRECTORY_PATH
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".json"):
+                rows = json.load(f)
+            else:
+                rows = list(csv.DictReader(f))
+        entries = []
+        for row in rows:
+            symbol = (row.get("symbol") or "").strip().upper()
+            name = (row.get("name") or "").strip()
+            if not symbol or not name:
+                continue
+            aliases = row.get("aliases") or []
+            if isinstance(aliases, str):
+                aliases = [a for a in aliases.split("|") if a.strip()]
+            entries.append({
+                "symbol": symbol,
+                "name": name,
+                "exchange": (row.get("exchange") or "").strip() or None,
+                "aliases": [a.strip() for a in aliases],
+            })
+        print(f"✓ Symbol directory loaded: {len(entries)} companies from {path}")
+        return cls(entries)
+
+    def _add(self, entry):
+        position = len(self.entries)
+        self.entries.append(entry)
+        symbol = entry["symbol"].lower()
+        if symbol not in self._symbols:
+            self._symbols[symbol] = position
+            self._insert_prefix(symbol, position)
+        keys = [normalize_name(entry["name"])] + [normalize_name(alias) for alias in entry["aliases"]]
+        for key in keys:
+            if key and key not in self._index:
+                self._index[key] = position
+                self._insert_prefix(key, position)
+
+    def _insert_prefix(self, key: str, position: int):
+        node = self._trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault("$", []).append(position)
+
+    def _prefix_positions(self, prefix: str, limit: int):
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        # Breadth-first so shorter (closer) completions come first
+        found = []
+        level = [node]
+        while level and len(found) < limit:
+            next_level = []
+            for current in level:
+                for position in current.get("$", []):
+                    if position not in found:
+                        found.append(position)
+                for char, child in sorted(current.items()):
+                    if char != "$":
+                        next_level.append(child)
+            level = next_level
+        return found[:limit]
+
+    def _exact_position(self, name: str):
+        position = self._index.get(normalize_name(name))
+        if position is None:
+            position = self._symbols.get(name.strip().lower())
+        return position
+
+    def lookup(self, name: str):
+        """Exact match on normalized name or alias, then on symbol"""
+        position = self._exact_position(name)
+        return self.entries[position] if position is not None else None
+
+    def resolve(self, name: str):
+        """
+        Best single entry for a free-text company name, or None.
+        Tries exact, then the longest indexed key the name starts with
+        ("Tesla Motors Europe" -> tesla), then a unique prefix, then fuzzy.
+        """
+        if not name or not name.strip():
+            return None
+        entry = self.lookup(name)
+        if entry:
+            return entry
+
+        words = normalize_name(name).split()
+        for end in range(len(words) - 1, 0, -1):
+            position = self._index.get(" ".join(words[:end]))
+            if position is not None:
+                return self.entries[position]
+
+        key = " ".join(words)
+        if len(key) >= 3:
+            positions = self._prefix_positions(key, 2)
+            if len(positions) == 1:
+                return self.entries[positions[0]]
+
+        close = difflib.get_close_matches(key, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+        if close:
+            return self.entries[self._index[close[0]]]
+        return None
+
+    def resolve_symbol(self, name: str):
+        """Ticker for a company name; bare ticker-looking input is passed through"""
+        entry = self.resolve(name)
+        if entry:
+            return entry["symbol"]
+        candidate = name.strip()
+        if _TICKER_RE.match(candidate):
+            return candidate
+        return None
+
+    def suggest(self, query: str, limit: int = 10):
+        """Autocomplete: prefix matches first, then fuzzy matches for misspellings"""
+        key = normalize_name(query) if query else ""
+        if not key:
+            return []
+        results = []
+        seen = set()
+
+        def add(position, match):
+            if position not in seen and len(results) < limit:
+                seen.add(position)
+                results.append({**self.entries[position], "match": match})
+
+        exact = self._exact_position(query)
+        if exact is not None:
+            add(exact, "exact")
+        for position in self._prefix_positions(key, limit):
+            add(position, "prefix")
+        if len(results) < limit:
+            for close in difflib.get_close_matches(key, self._keys, n=limit, cutoff=0.6):
+                add(self._index[close], "fuzzy")
+        return results
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_directory() -> SymbolDirectory:
+    """Process-wide directory, loaded on first use"""
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                try:
+                    _directory = SymbolDirectory.load()
+                except Exception as e:
+                    print(f"✗ Failed to load symbol directory: {e}")
+                    _directory = SymbolDirectory([])
+    return _directory
+
+
+def resolve_ticker(company_name: str):
+    return get_directory().resolve_symbol(company_name)
@@ -1,4 +1,4 @@
-import requests
+from app.services import http_client
 from bs4 import BeautifulSoup
 import feedparser
 
@@ -7,7 +7,7 @@ import feedparser
 # -----------------------------
 def get_wikipedia(company):
     url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{company}"
-    r = requests.get(url).json()
+    r = http_client.get(url).json()
     return {
         "title": r.get("title"),
         "description": r.get("description"),
@@ -19,7 +19,7 @@ def get_wikipedia(company):
 # -----------------------------
 def ddg_search(query):
     url = f"https://ddg-api.herokuapp.com/search?query={query}"
-    r = requests.get(url).json()
+    r = http_client.get(url).json()
     return r[:5] if isinstance(r, list) else None
 
 # -----------------------------
@@ -27,7 +27,7 @@ def ddg_search(query):
 # -----------------------------
 def scrape_website(url):
     try:
-        html = requests.get(url, timeout=10).text
+        html = http_client.get(url, timeout=10).text
         soup = BeautifulSoup(html, "html.parser")
 
         text_blocks = " ".join([p.text for p in soup.find_all("p")[:20]])
@@ -54,7 +54,7 @@ def scrape_website(url):
 # -----------------------------
 def get_news(company):
     url = f"https://news.google.com/rss/search?q={company}"
-    feed = feedparser.parse(url)
+    feed = feedparser.parse(http_client.get(url).content)
     return [
         {"title": e.title, "link": e.link}
         for e in feed.entries[:10]
@@ -65,7 +65,7 @@ def get_news(company):
 # -----------------------------
 def get_financials(symbol):
     url = f"https://finance.yahoo.com/quote/{symbol}"
-    html = requests.get(url).text
+    html = http_client.get(url).text
     soup = BeautifulSoup(html, "html.parser")
 
     info = {}
@@ -0,0 +1,259 @@
+import contextvars
+import re
+import threading
+from concurrent.futures import Future
+
+from app.services.revalidation import conditional_get
+from app.services.source_cache import cached_source
+from app.services.symbol_directory import get_directory
+
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+
+# Infobox parameter -> label used by the rendered infobox table
+INFOBOX_LABELS = {
+    "type": "Type",
+    "traded_as": "Traded as",
+    "isin": "ISIN",
+    "industry": "Industry",
+    "founded": "Founded",
+    "founder": "Founders",
+    "founders": "Founders",
+    "hq_location": "Headquarters",
+    "hq_location_city": "Headquarters",
+    "hq_location_country": "Headquarters country",
+    "headquarters": "Headquarters",
+    "area_served": "Area served",
+    "key_people": "Key people",
+    "products": "Products",
+    "services": "Services",
+    "brands": "Brands",
+    "revenue": "Revenue",
+    "operating_income": "Operating income",
+    "net_income": "Net income",
+    "assets": "Total assets",
+    "equity": "Total equity",
+    "num_employees": "Number of employees",
+    "owner": "Owner",
+    "parent": "Parent",
+    "divisions": "Divisions",
+    "subsid": "Subsidiaries",
+    "subsidiaries": "Subsidiaries",
+    "website": "Website",
+}
+_SKIPPED_PARAMS = {"name", "logo", "logo_size", "logo_alt", "logo_caption", "image", "image_size", "image_alt", "image_caption", "caption"}
+_EXCHANGE_TEMPLATE_RE = re.compile(r"\{\{\s*(NASDAQ|Nasdaq|NYSE|NYSE American|NYSE Arca|LSE|TSX|ASX|FWB|Euronext|SEHK|TYO|BSE|NSE|SIX|OTC Pink)\s*\|\s*([A-Za-z0-9.\-]+)\s*\}\}")
+
+# Per-request memo (set by the research pipeline) so every source that needs
+# the Wikipedia document shares one fetch
+_request_memo = contextvars.ContextVar("wikipedia_request_memo", default=None)
+_memo_lock = threading.Lock()
+
+
+def begin_request_scope():
+    """Start a fresh per-request memo; returns a token for end_request_scope"""
+    return _request_memo.set({})
+
+
+def end_request_scope(token):
+    _request_memo.reset(token)
+
+
+def _find_template(wikitext: str, name: str):
+    """Return the body of the first {{name ...}} template, braces balanced"""
+    match = re.search(r"\{\{\s*" + name, wikitext, re.IGNORECASE)
+    if not match:
+        return None
+    depth = 0
+    i = match.start()
+    while i < len(wikitext) - 1:
+        pair = wikitext[i:i + 2]
+        if pair == "{{":
+            depth += 1
+            i += 2
+            continue
+        if pair == "}}":
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return wikitext[match.start() + 2:i - 2]
+            continue
+        i += 1
+    return None
+
+
+def _split_top_level(body: str):
+    """Split template body on "|" that are not nested in [[...]] or {{...}}"""
+    parts = []
+    depth = 0
+    current = []
+    i = 0
+    while i < len(body):
+        pair = body[i:i + 2]
+        if pair in ("{{", "[["):
+            depth += 1
+            current.append(pair)
+            i += 2
+            continue
+        if pair in ("}}", "]]"):
+            depth -= 1
+            current.append(pair)
+            i += 2
+            continue
+        if body[i] == "|" and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(body[i])
+        i += 1
+    parts.append("".join(current))
+    return parts
+
+
+def _clean_template(match):
+    params = _split_top_level(match.group(1))
+    name = params[0].strip().lower()
+    values = [p.strip() for p in params[1:] if p.strip() and not re.match(r"^\s*[\w ]+\s*=", p)]
+    if name in ("increase", "decrease", "steady", "nbsp", "small", "refn", "efn", "sfn"):
+        return " " if name == "nbsp" else ""
+    if name in ("us$", "usd"):
+        return "US$" + " ".join(values)
+    if name.startswith("start date") and values:
+        return "-".join(values[:3])
+    if name in ("ubl", "unbulleted list", "hlist", "flatlist", "plainlist", "plain list"):
+        # Items are either separate params or "* item" lines
+        items = [item for value in values for item in re.split(r"\n\s*\*", "\n" + value)]
+        return ", ".join(item.strip(" *\n") for item in items if item.strip(" *\n"))
+    return " ".join(values)
+
+
+def clean_wikitext(value: str) -> str:
+    """Reduce a wikitext fragment to readable plain text"""
+    value = re.sub(r"<!--.*?-->", "", value, flags=re.S)
+    value = re.sub(r"<ref[^>]*/>", "", value)
+    value = re.sub(r"<ref[^>]*>.*?</ref>", "", value, flags=re.S)
+    value = re.sub(r"<br\s*/?>", ", ", value)
+    value = re.sub(r"<[^>]+>", "", value)
+    # Innermost templates first, until none are left
+    for _ in range(10):
+        value, count = re.subn(r"\{\{([^{}]*)\}\}", _clean_template, value)
+        if not count:
+            break
+    value = re.sub(r"\[\[(?:[^\]|]*\|)?([^\]]*)\]\]", r"\1", value)
+    value = re.sub(r"\[https?://\S+\s+([^\]]+)\]", r"\1", value)
+    value = value.replace("'''", "").replace("''", "")
+    value = re.sub(r"^\s*\*\s*", "", value, flags=re.M)
+    value = " ".join(value.split())
+    return value.strip(" ,")
+
+
+def parse_infobox(wikitext: str):
+    """Infobox rows keyed by display label, plus any exchange:ticker listings"""
+    body = _find_template(wikitext or "", "Infobox")
+    if not body:
+        return {}, []
+    tickers = [{"exchange": m.group(1), "symbol": m.group(2).upper()} for m in _EXCHANGE_TEMPLATE_RE.finditer(body)]
+    rows = {}
+    for part in _split_top_level(body)[1:]:
+        if "=" not in part:
+            continue
+        key, value = part.split("=", 1)
+        key = key.strip().lower()
+        if not key or key in _SKIPPED_PARAMS:
+            continue
+        value = clean_wikitext(value)
+        if not value:
+            continue
+        label = INFOBOX_LABELS.get(key, key.replace("_", " ").capitalize())
+        if label not in rows:
+            rows[label] = value
+    return rows, tickers
+
+
+def _summary_from_extract(extract: str, sentences: int = 15):
+    """First `sentences` sentences of the lead section"""
+    intro = re.split(r"\n==", extract, maxsplit=1)[0].strip()
+    parts = re.split(r"(?<=[.!?])\s+", intro)
+    return " ".join(parts[:sentences])
+
+
+def _search_term(company: str):
+    # Searching the directory's canonical name ("Apple Inc.") lands on the
+    # company article instead of a same-named topic. Only an exact name, alias
+    # or ticker match is swapped: fuzzy or prefix matches would send
+    # subsidiaries ("Oracle Health") to the parent's article
+    entry = get_directory().lookup(company)
+    return entry["name"] if entry else company
+
+
+@cached_source("wikipedia_doc")
+def fetch_wikipedia_document(company: str):
+    """
+    Extract, lead summary, infobox, thumbnail and URL for the best matching
+    article, all from a single MediaWiki API query.
+    """
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": 2,
+        "redirects": 1,
+        "generator": "search",
+        "gsrsearch": _search_term(company),
+        "gsrlimit": 1,
+        "prop": "extracts|pageimages|info|revisions",
+        "explaintext": 1,
+        "exsectionformat": "wiki",
+        "piprop": "thumbnail|original",
+        "pithumbsize": 400,
+        "inprop": "url",
+        "rvprop": "content",
+        "rvslots": "main",
+        "rvsection": 0,
+    }
+    # Revalidated with ETag / Last-Modified when the API sends them
+    data = conditional_get(WIKI_API_URL, lambda response: response.json(), params=params, timeout=10)
+    pages = data.get("query", {}).get("pages", [])
+    if not pages or pages[0].get("missing"):
+        return None
+    page = pages[0]
+
+    extract = page.get("extract") or ""
+    wikitext = ""
+    revisions = page.get("revisions") or []
+    if revisions:
+        wikitext = revisions[0].get("slots", {}).get("main", {}).get("content", "")
+    infobox, tickers = parse_infobox(wikitext)
+
+    return {
+        "pageid": page.get("pageid"),
+        "title": page.get("title"),
+        "url": page.get("fullurl"),
+        "extract": extract,
+        "summary": _summary_from_extract(extract),
+        "infobox": infobox,
+        "tickers": tickers,
+        "thumbnail": (page.get("thumbnail") or {}).get("source"),
+        "image": (page.get("original") or {}).get("source"),
+    }
+
+
+def get_wikipedia_document(company: str):
+    """
+    Wikipedia document for `company`, shared by every consumer in the current
+    research request: concurrent callers wait on the first caller's fetch.
+    """
+    memo = _request_memo.get()
+    if memo is None:
+        return fetch_wikipedia_document(company)
+
+    key = " ".join(company.lower().split())
+    with _memo_lock:
+        future = memo.get(key)
+        owner = future is None
+        if owner:
+            future = memo[key] = Future()
+    if owner:
+        try:
+            future.set_result(fetch_wikipedia_document(company))
+        except Exception as e:
+            future.set_exception(e)
+    return future.result()